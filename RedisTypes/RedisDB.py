@@ -1,4 +1,12 @@
-from tcutils.ping import ping
+import select
+import socket
+from contextlib import contextmanager
+from hashlib import sha1
+from queue import LifoQueue, Empty, Full
+from threading import Event, RLock, Thread, local
+from time import monotonic
+
+from RedisTypes.resp import pack_command, pack_commands
 import redis
 
 
@@ -6,16 +14,362 @@ class NetworkError(BaseException):
     pass
 
 
+# (host, port) -> (checked_at, reachable)
+_reachability = {}
+
+
+def reachable(host: str, port: int, timeout: float=1, ttl: float=60) -> bool:
+    """
+    Returns True if a TCP connection to host:port can be opened within timeout seconds
+    The result is cached for ttl seconds per host and port.
+    :param host: str
+    :param port: int
+    :param timeout: float
+    :param ttl: float, 0 disables the cache
+    :return: boolean
+    """
+    checked = _reachability.get((host, port))
+    if checked is not None and monotonic() - checked[0] < ttl:
+        return checked[1]
+    try:
+        socket.create_connection((host, port), timeout).close()
+        result = True
+    except OSError:
+        result = False
+    _reachability[host, port] = (monotonic(), result)
+    return result
+
+
+class ConnectionPool:
+    """
+    Bounded pool of redis.Connection objects
+    Connections are created on first checkout, health checked with a PING when
+    they sat idle for longer than health_check_interval seconds, and dropped
+    to be recreated when they fail.
+    """
+    def __init__(self, host, port, size, timeout=None, health_check_interval=30):
+        if size < 1:
+            raise ValueError("Pool size should be at least 1.")
+        self._host = host
+        self._port = port
+        self._size = size
+        self._timeout = timeout
+        self._health_check_interval = health_check_interval
+        # Slots hold (connection, last_used) tuples, None until a connection is created
+        self._slots = LifoQueue(size)
+        for _ in range(size):
+            self._slots.put_nowait(None)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _make_connection(self):
+        return redis.Connection(self._host, self._port)
+
+    def _is_healthy(self, connection) -> bool:
+        try:
+            connection.send_command("PING")
+            return connection.read_response() in (b'PONG', 'PONG')
+        except (redis.ConnectionError, redis.TimeoutError):
+            return False
+
+    def checkout(self):
+        """
+        Takes a connection out of the pool, blocking up to timeout seconds
+        :return: redis.Connection
+        """
+        try:
+            slot = self._slots.get(timeout=self._timeout)
+        except Empty:
+            raise ConnectionError("No connection available in pool after {}s.".format(self._timeout))
+        if slot is None:
+            return self._make_connection()
+        connection, last_used = slot
+        if monotonic() - last_used > self._health_check_interval and not self._is_healthy(connection):
+            connection.disconnect()
+        return connection
+
+    def checkin(self, connection):
+        """
+        Gives a connection back to the pool
+        :param connection: redis.Connection, or None to release a broken slot
+        """
+        try:
+            self._slots.put_nowait(None if connection is None else (connection, monotonic()))
+        except Full:
+            raise ValueError("Connection checked in to a full pool.")
+
+    @contextmanager
+    def connection(self):
+        connection = self.checkout()
+        try:
+            yield connection
+        except redis.ResponseError:
+            # Error reply from the server, the connection itself is fine
+            raise
+        except BaseException:
+            # The reply may be left unread on the socket, drop it
+            connection.disconnect()
+            raise
+        finally:
+            self.checkin(connection)
+
+    def disconnect(self):
+        """
+        Closes every idle connection of the pool
+        """
+        slots = []
+        while True:
+            try:
+                slots.append(self._slots.get_nowait())
+            except Empty:
+                break
+        for slot in slots:
+            if slot is not None:
+                slot[0].disconnect()
+            self._slots.put_nowait(None)
+
+
+def _command_args(args) -> tuple:
+    if len(args) == 1 and isinstance(args[0], str):
+        return tuple(args[0].split())
+    return args
+
+
+class PendingReply:
+    """
+    Reply of a command queued in a Pipeline, available once the pipeline is flushed
+    """
+    __slots__ = ('_transform', '_value', '_ready')
+
+    def __init__(self, transform=None):
+        self._transform = transform
+        self._value = None
+        self._ready = False
+
+    def _resolve(self, reply):
+        if self._transform is not None and not isinstance(reply, Exception):
+            try:
+                reply = self._transform(reply)
+            except Exception as error:
+                reply = error
+        self._value = reply
+        self._ready = True
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def value(self):
+        if not self._ready:
+            raise RuntimeError("Pipeline has not been flushed yet.")
+        if isinstance(self._value, Exception):
+            raise self._value
+        return self._value
+
+    def __repr__(self) -> str:
+        return "<PendingReply {}>".format(repr(self._value) if self._ready else "(not flushed)")
+
+
+class Pipeline:
+    """
+    Queues commands and sends them in a single write on flush, replies are read back in order
+    Used as a context manager it becomes the active pipeline of its RedisDB for the current
+    thread, so RedisTypes bound to that RedisDB queue their commands into it, and it is
+    flushed on exit.
+    """
+    def __init__(self, redisdb, raise_on_error=True):
+        self._db = redisdb
+        self._raise_on_error = raise_on_error
+        self._commands = []
+        self._pending = []
+        self.replies = []
+
+    def execute(self, *args, transform=None) -> PendingReply:
+        """
+        Queues a command
+        :param args: command name and arguments
+        :param transform: callable applied to the raw reply on flush
+        :return: PendingReply
+        """
+        reply = PendingReply(transform)
+        self._commands.append(_command_args(args))
+        self._pending.append(reply)
+        return reply
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def flush(self) -> list:
+        """
+        Sends every queued command and reads their replies
+        Error replies are returned as exceptions, and the first one is raised
+        once all replies are read unless raise_on_error is False.
+        :return: list
+        """
+        if not self._commands:
+            return []
+        commands, pending = self._commands, self._pending
+        self._commands, self._pending = [], []
+        try:
+            raws = self._db._execute_batch(commands)
+        except BaseException as error:
+            # Replies can't be read back, they all fail with the error
+            for reply in pending:
+                reply._resolve(error if isinstance(error, Exception) else RuntimeError("Pipeline flush interrupted."))
+            raise
+        for reply, raw in zip(pending, raws):
+            reply._resolve(raw)
+        replies = [reply._value for reply in pending]
+        self.replies.extend(replies)
+        if self._raise_on_error:
+            for reply in replies:
+                if isinstance(reply, Exception):
+                    raise reply
+        return replies
+
+    def __enter__(self):
+        self._db._push_pipeline(self)
+        return self
+
+    def discard(self):
+        """
+        Drops the queued commands without sending them, their replies fail
+        """
+        pending = self._pending
+        self._commands, self._pending = [], []
+        for reply in pending:
+            reply._resolve(RuntimeError("Pipeline discarded before flush."))
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._db._pop_pipeline(self)
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
+
+
+class Subscription(Thread):
+    """
+    Listens to pub/sub channels on a dedicated connection, in a daemon thread
+    callback(channel, message) is called for every message. on_reset() is called
+    whenever messages may have been missed: when the connection drops and once
+    the channels are subscribed again.
+    """
+    RETRY_INTERVAL = 1
+
+    def __init__(self, host, port, channels, callback, on_reset=None, pattern=False):
+        super(Subscription, self).__init__(daemon=True)
+        self._host = host
+        self._port = port
+        self._channels = channels
+        self._callback = callback
+        self._on_reset = on_reset
+        self._pattern = pattern
+        self._connection = None
+        self._closed = Event()
+
+    def _reset(self):
+        if self._on_reset is not None:
+            self._on_reset()
+
+    def run(self):
+        while not self._closed.is_set():
+            self._connection = redis.Connection(self._host, self._port)
+            try:
+                self._connection.send_command("PSUBSCRIBE" if self._pattern else "SUBSCRIBE", *self._channels)
+                while True:
+                    reply = self._connection.read_response()
+                    kind = reply[0]
+                    if kind == b'message':
+                        self._callback(reply[1], reply[2])
+                    elif kind == b'pmessage':
+                        self._callback(reply[2], reply[3])
+                    elif kind in (b'subscribe', b'psubscribe'):
+                        self._reset()
+            except Exception as error:
+                # close() tears the connection down under our feet, whatever it raised
+                if self._closed.is_set():
+                    break
+                if not isinstance(error, (redis.ConnectionError, redis.TimeoutError, OSError)):
+                    raise
+                self._reset()
+                self._closed.wait(self.RETRY_INTERVAL)
+            finally:
+                self._connection.disconnect()
+
+    def close(self):
+        """
+        Stops listening, the dedicated connection is closed
+        """
+        self._closed.set()
+        if self._connection is not None:
+            self._connection.disconnect()
+
+
+class Script:
+    """
+    Lua script run with EVALSHA, its SHA1 is computed locally so it is only sent with
+    SCRIPT LOAD the first time the server answers NOSCRIPT (first use, server restart...)
+    """
+    def __init__(self, redisdb, source: str):
+        self._db = redisdb
+        self.source = source
+        self.sha = sha1(source.encode()).hexdigest()
+
+    def __call__(self, keys=(), args=()):
+        """
+        :param keys: sequence of key names, KEYS in the script
+        :param args: sequence of arguments, ARGV in the script
+        :return: object
+        """
+        try:
+            return self._db.execute("EVALSHA", self.sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            self._db.execute("SCRIPT", "LOAD", self.source)
+            return self._db.execute("EVALSHA", self.sha, len(keys), *keys, *args)
+
+
 class RedisDB:
     DEFAULTPORT = 6379
+    # Reachability check: TCP connect timeout, and seconds its result is cached per host
+    CHECK_TIMEOUT = 1
+    CHECK_TTL = 60
 
-    def __init__(self, host, port=DEFAULTPORT):
-        if not ping(host):
-            raise NetworkError("Host {} is unreachable.".format(host))
+    def __init__(self, host, port=DEFAULTPORT, pool_size=None, pool_timeout=None, lazy=False):
+        """
+        :param host: str
+        :param port: int
+        :param pool_size: int, enables the pooled mode with at most pool_size connections
+        :param pool_timeout: float, seconds to wait for a free pooled connection (None waits forever)
+        :param lazy: bool, defer the reachability check and the connection to the first command
+        """
         self._host = host
         self._port = port
         self._connection = None
-        self._connect()
+        # Serializes the request/reply exchanges on the single connection of the non pooled mode
+        self._lock = RLock()
+        self._pool = None
+        self._local = local()
+        self._checked = False
+        self._scripts = {}
+        if not lazy:
+            self._check()
+        if pool_size is not None:
+            self._pool = ConnectionPool(host, port, pool_size, pool_timeout)
+        elif not lazy:
+            self._connect()
+
+    def _check(self):
+        if not reachable(self._host, self._port, self.CHECK_TIMEOUT, self.CHECK_TTL):
+            raise NetworkError("Host {}:{} is unreachable.".format(self._host, self._port))
+        self._checked = True
+
+    @property
+    def pooled(self) -> bool:
+        return self._pool is not None
 
     def _connect(self):
         if self._connection:
@@ -24,16 +378,128 @@ class RedisDB:
             self._connection = redis.Connection(self._host, self._port)
 
     def _disconnect(self):
+        if self._pool is not None:
+            self._pool.disconnect()
+            return
         if not self._connection:
             raise ConnectionError("No active connection.")
         self._connection.disconnect()
         self._connection = None
 
-    def execute(self, command):
-        if not self._connection:
-            self._connect()
-        self._connection.send_command(command)
-        return self._connection.read_response()
+    @contextmanager
+    def _connection_context(self):
+        if not self._checked:
+            self._check()
+        if self._pool is not None:
+            with self._pool.connection() as connection:
+                yield connection
+        else:
+            with self._lock:
+                if not self._connection:
+                    self._connect()
+                yield self._connection
+
+    @staticmethod
+    def _is_stale(connection) -> bool:
+        # An idle connection has nothing to read: readable means closed by the server (EOF)
+        sock = connection._sock
+        if sock is None:
+            return False
+        try:
+            return bool(select.select([sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    @classmethod
+    def _send(cls, connection, packed):
+        # Reconnect stale idle sockets before writing anything. Once bytes are written a
+        # prefix of the commands may have run, so errors propagate instead of a resend.
+        if cls._is_stale(connection):
+            connection.disconnect()
+        # send_packed_command iterates over its argument, wrap the buffer in a list
+        connection.send_packed_command([packed])
+
+    def execute(self, *args):
+        """
+        Runs one command and returns its reply
+        Arguments are sent as separate binary safe bulk strings, a single string
+        argument is split on whitespace for backward compatibility.
+        :param args: command name and arguments
+        :return: object
+        """
+        with self._connection_context() as connection:
+            self._send(connection, pack_command(_command_args(args)))
+            return connection.read_response()
+
+    def _execute_batch(self, commands) -> list:
+        with self._connection_context() as connection:
+            self._send(connection, pack_commands(commands))
+            replies = []
+            for _ in commands:
+                # Keep reading after an error reply so the connection stays in sync
+                try:
+                    replies.append(connection.read_response())
+                except redis.ResponseError as error:
+                    replies.append(error)
+            return replies
+
+    def pipeline(self, raise_on_error=True) -> Pipeline:
+        """
+        :param raise_on_error: bool, raise the first error reply on flush
+        :return: Pipeline
+        """
+        return Pipeline(self, raise_on_error)
+
+    @property
+    def current_pipeline(self):
+        """
+        :return: the Pipeline active in the current thread, or None
+        """
+        stack = getattr(self._local, 'pipelines', None)
+        return stack[-1] if stack else None
+
+    def _push_pipeline(self, pipeline):
+        if not hasattr(self._local, 'pipelines'):
+            self._local.pipelines = []
+        self._local.pipelines.append(pipeline)
+
+    def _pop_pipeline(self, pipeline):
+        self._local.pipelines.remove(pipeline)
+
+    def register_script(self, name: str, source: str) -> Script:
+        """
+        Registers a Lua script under name, registering the same source again is a no-op
+        :param name: str
+        :param source: str
+        :return: Script
+        """
+        script = self._scripts.get(name)
+        if script is None or script.source != source:
+            script = self._scripts[name] = Script(self, source)
+        return script
+
+    def script(self, name: str) -> Script:
+        """
+        :param name: str
+        :return: Script registered under name
+        """
+        try:
+            return self._scripts[name]
+        except KeyError:
+            raise KeyError("No script registered as {}.".format(name))
+
+    def subscribe(self, *channels, callback, on_reset=None, pattern: bool=False) -> Subscription:
+        """
+        Starts listening to pub/sub channels, see Subscription
+        :param channels: str
+        :param callback: callable(channel, message)
+        :param on_reset: callable, called when messages may have been missed
+        :param pattern: bool, channels are glob style patterns (PSUBSCRIBE)
+        :return: Subscription
+        """
+        subscription = Subscription(self._host, self._port, channels, callback, on_reset, pattern)
+        subscription.start()
+        return subscription
 
 
 def test():
@@ -1,15 +1,65 @@
-from collections import Iterable
+from collections.abc import Iterable
+from contextlib import suppress
+from functools import partial
+from itertools import chain, islice
+from threading import Lock, Timer
 from typing import Dict, Generator
 
-from RedisTypes.RedisDB import RedisDB
+from RedisTypes.RedisDB import PendingReply, RedisDB
+from RedisTypes.cache import LocalCache, MISSING
+from RedisTypes.decoders import Decoder, TEXT
+from RedisTypes.resp import encode
+from RedisTypes.serializers import Codec
+from RedisTypes.sharding import ShardedRedisDB
 from tcutils.type_hinting import CheckFunctionTypeMetaClass, EnforceFunctionTypeMetaClass
 
 
-def _retype(bytestring: bytes):
-        s = str(bytestring)[2:-1]
-        if s.isnumeric():
-            s = int(s)
-        return s
+# Marks a field deleted in a dict write buffer
+_DELETED = object()
+# Cached in place of the fields missing on the server, as None may be a stored value
+_ABSENT = object()
+
+# Lua scripts backing the atomic multi-field dict operations, KEYS[1] is the hash
+_INCR_MANY = """
+local result = {}
+for i = 1, #ARGV, 2 do
+    result[#result + 1] = redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return result
+"""
+
+_SETDEFAULT_MANY = """
+local result = {}
+for i = 1, #ARGV, 2 do
+    redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1])
+    result[#result + 1] = redis.call('HGET', KEYS[1], ARGV[i])
+end
+return result
+"""
+
+_COMPARE_AND_SET = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def _flatten_items(dico: Dict, codec: Codec=None) -> list:
+    args = []
+    if codec is None:
+        for item in dico.items():
+            args += item
+    else:
+        for key, value in dico.items():
+            args += (key, codec.encode(value))
+    return args
+
+
+def _chunks(sequence, size: int) -> Generator:
+    for start in range(0, len(sequence), size):
+        yield sequence[start:start + size]
 
 
 # For type_hinting debugging, add metaclass:
@@ -17,11 +67,85 @@ def _retype(bytestring: bytes):
 #  or for throwing exceptions on bad type:
 # class RedisType(metaclass=EnforceFunctionTypeMetaClass)
 class RedisType:
-    def __init__(self, name: str, redisdb: RedisDB):
+    def __init__(self, name: str, redisdb: RedisDB, decoder: Decoder=TEXT, codec: Codec=None):
+        """
+        :param name: str
+        :param redisdb: RedisDB.RedisDB, or sharding.ShardedRedisDB to use the node owning name
+        :param decoder: decoders.Decoder used on replies, decoders.RAW keeps bytes
+        :param codec: serializers.Codec used on values (e.g. serializers.JSON), they are
+         formatted as text and read back with the decoder otherwise
+        """
+        if isinstance(redisdb, ShardedRedisDB):
+            redisdb = redisdb.node_for(name)
         if not isinstance(redisdb, RedisDB):
             raise TypeError("Please provide a correct RedisDB.")
+        if not isinstance(decoder, Decoder):
+            raise TypeError("Please provide a correct Decoder.")
+        if codec is not None and not isinstance(codec, Codec):
+            raise TypeError("Please provide a correct Codec.")
         self._name = name
         self._db = redisdb
+        self._decoder = decoder
+        self._codec = codec
+        # Decoder for values
+        self._values = decoder if codec is None else codec
+
+    def _encode_value(self, value: object) -> object:
+        return value if self._codec is None else self._codec.encode(value)
+
+    def _decode_pairs(self, reply) -> list:
+        if self._values is self._decoder:
+            return self._decoder.decode_pairs(reply)
+        return std_list(zip(self._decoder.decode_many(reply[0::2]), self._values.decode_many(reply[1::2])))
+
+    def _execute(self, *args, transform=None, deferrable: bool=True):
+        """
+        Runs a command on the database, or queues it when a pipeline is active
+        in the current thread, in which case a RedisDB.PendingReply is returned.
+        Non deferrable commands flush the active pipeline and run right away.
+        :param args: command name and arguments
+        :param transform: callable applied to the reply
+        :param deferrable: bool
+        :return: object
+        """
+        pipeline = self._db.current_pipeline
+        if pipeline is not None:
+            if deferrable:
+                return pipeline.execute(*args, transform=transform)
+            pipeline.flush()
+        reply = self._db.execute(*args)
+        return reply if transform is None else transform(reply)
+
+
+    def _execute_chunks(self, commands) -> list:
+        """
+        Runs several commands in a single pipeline round trip and returns their replies.
+        An active pipeline is flushed first.
+        :param commands: list of argument sequences
+        :return: list
+        """
+        pipeline = self._db.current_pipeline
+        if pipeline is not None:
+            pipeline.flush()
+        with self._db.pipeline() as batch:
+            replies = [batch.execute(*args) for args in commands]
+        return [reply.value for reply in replies]
+
+    def _script(self, name: str, source: str, args, transform=None):
+        """
+        Runs a Lua script on this container, registered on the RedisDB under name.
+        An active pipeline is flushed first, as NOSCRIPT can't be recovered from inside it.
+        :param name: str
+        :param source: str
+        :param args: sequence, ARGV of the script
+        :param transform: callable applied to the reply
+        :return: object
+        """
+        pipeline = self._db.current_pipeline
+        if pipeline is not None:
+            pipeline.flush()
+        reply = self._db.register_script(name, source)((self._name,), args)
+        return reply if transform is None else transform(reply)
 
 
 class InitializationError(BaseException):
@@ -36,21 +160,183 @@ class dict(RedisType):
     """
     http://redis.io/commands#hash
     """
+    # Fields fetched per HSCAN round trip by the streaming iterators
+    SCAN_COUNT = 100
+    # Fields per HMGET/HSET/HDEL command in the bulk methods, bigger inputs are chunked
+    BULK_CHUNK = 1000
+
+    def __init__(self, name: str, redisdb: RedisDB, decoder: Decoder=TEXT, codec: Codec=None,
+                 cache: LocalCache=None, buffer_size: int=None, flush_interval: float=None):
+        """
+        Setting buffer_size or flush_interval enables the write-behind mode: writes and
+        deletes are coalesced per field in memory and sent as one HSET and one HDEL when
+        buffer_size fields are pending, flush_interval seconds after the first pending
+        write, or when flush() is called. Reads stay consistent with buffered writes.
+        :param name: str
+        :param redisdb: RedisDB.RedisDB
+        :param decoder: decoders.Decoder used on replies
+        :param codec: serializers.Codec used on values
+        :param cache: cache.LocalCache answering repeated reads locally, writes through
+         this object invalidate it, see listen_invalidations for other writers
+        :param buffer_size: int, pending fields triggering a flush
+        :param flush_interval: float, seconds pending writes may wait before a flush
+        """
+        super(dict, self).__init__(name, redisdb, decoder, codec)
+        self._cache = cache
+        self._subscription = None
+        self._buffered = buffer_size is not None or flush_interval is not None
+        self._buffer_size = buffer_size
+        self._flush_interval = flush_interval
+        self._pending = {}
+        # field: (value, RedisDB.PendingReply) of the writes queued by a flush
+        self._flushing = {}
+        self._pending_lock = Lock()
+        self._flush_timer = None
+
+    def _cached(self) -> bool:
+        # Reads queued in a pipeline always go to the server
+        return self._cache is not None and self._db.current_pipeline is None
+
+    def _invalidate(self, key: object):
+        if self._cache is not None:
+            self._cache.invalidate(encode(key))
+
+    def _invalidating(self, keys, transform=None):
+        """
+        Wraps the transform of a write so that keys are invalidated again once it is
+        acknowledged, and a read racing with the write can't cache the previous value
+        :param keys: iterable of the written keys
+        :param transform: callable applied to the reply
+        :return: callable
+        """
+        if self._cache is None:
+            return transform
+
+        def acknowledged(reply):
+            for key in keys:
+                self._invalidate(key)
+            return reply if transform is None else transform(reply)
+        return acknowledged
+
+    def listen_invalidations(self, database: int=0):
+        """
+        Clears the local cache whenever the hash is modified by any client, using keyspace
+        notifications. The server must have them enabled for hash and generic events,
+        e.g. CONFIG SET notify-keyspace-events Kgh
+        :param database: int, database number of the hash
+        :return: RedisDB.Subscription
+        """
+        if self._cache is None:
+            raise ValueError("No local cache to invalidate.")
+        if self._subscription is None:
+            cache = self._cache
+            channel = "__keyspace@{}__:{}".format(database, self._name)
+            self._subscription = self._db.subscribe(channel, callback=lambda channel, event: cache.clear(),
+                                                    on_reset=cache.clear)
+        return self._subscription
+
+    def _buffer(self, key: object, value: object):
+        with self._pending_lock:
+            self._pending[encode(key)] = value
+            if self._flush_interval is not None and self._flush_timer is None:
+                self._flush_timer = Timer(self._flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+            full = (self._buffer_size is not None
+                    and len(self._pending) - len(self._flushing) >= self._buffer_size)
+        if full:
+            self.flush()
+
+    def _pending_value(self, key: object):
+        # Buffered value of key as the server would return it, or cache.MISSING
+        value = self._pending.get(encode(key), MISSING)
+        if value is MISSING or value is _DELETED:
+            return value
+        return self._values.decode(encode(value))
+
+    def flush(self) -> int:
+        """
+        Sends the buffered writes, as a single HSET and a single HDEL in one round trip
+        :return: int, number of fields flushed
+        """
+        with self._pending_lock:
+            # Writes stay in the buffer, hence readable, until the server acknowledges them.
+            # Those already queued by a previous flush and not replied to are not sent again,
+            # those whose pipeline failed or was discarded are.
+            sets, deletes = {}, {}
+            for field, value in self._pending.items():
+                if not self._in_flight(field, value):
+                    self._flushing.pop(field, None)
+                    (deletes if value is _DELETED else sets)[field] = value
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if not sets and not deletes:
+            return 0
+        try:
+            # Join the caller's pipeline if there is one, to keep the commands in order
+            with self._db.pipeline() if self._db.current_pipeline is None else suppress():
+                if sets:
+                    reply = self._execute("HSET", self._name, *chain.from_iterable(sets.items()),
+                                          transform=partial(self._acknowledge, sets))
+                    self._send_off(sets, reply)
+                if deletes:
+                    reply = self._execute("HDEL", self._name, *deletes,
+                                          transform=partial(self._acknowledge, deletes))
+                    self._send_off(deletes, reply)
+        except BaseException:
+            # Nothing was acknowledged, the next flush sends the writes again
+            with self._pending_lock:
+                for field in chain(sets, deletes):
+                    self._flushing.pop(field, None)
+            raise
+        return len(sets) + len(deletes)
+
+    def _in_flight(self, field: bytes, value: object) -> bool:
+        # Whether this very write is queued by a flush whose reply has not been read yet
+        sent = self._flushing.get(field)
+        return sent is not None and sent[0] is value and not sent[1].ready
+
+    def _send_off(self, flushed: std_dict, reply: PendingReply):
+        # Marks the writes as queued until reply is read, unless they were overwritten since
+        with self._pending_lock:
+            for field, value in flushed.items():
+                if self._pending.get(field) is value:
+                    self._flushing[field] = (value, reply)
+
+    def _acknowledge(self, flushed: std_dict, reply: object) -> object:
+        """
+        Drops the acknowledged writes from the buffer, unless they were overwritten since
+        :param flushed: dict, the writes acknowledged by reply
+        :param reply: raw reply
+        :return: reply
+        """
+        with self._pending_lock:
+            for field, value in flushed.items():
+                if self._pending.get(field) is value:
+                    del self._pending[field]
+                if self._flushing.get(field, (None,))[0] is value:
+                    del self._flushing[field]
+        if self._cache is not None:
+            for field in flushed:
+                self._cache.invalidate(field)
+        return reply
+
     @classmethod
-    def fromdict(cls, name: str, redisdb: RedisDB, dico: std_dict) -> std_dict:
+    def fromdict(cls, name: str, redisdb: RedisDB, dico: std_dict, **kwargs) -> std_dict:
         """
         Generates a tcutils.RedisTypes.dict from a builtin type dict
         :param name: str
         :param redisdb: RedisDB.RedisDB
         :param dico: dict
+        :param kwargs: passed to the constructor
         :return: tcutils.RedisTypes.dict
         """
-        command = "HMSET {}".format(name)
-        for key in dico.keys():
-            command += " {} {}".format(key, dico.get(key))
-        if not redisdb.execute(command) == b'OK':
+        if isinstance(redisdb, ShardedRedisDB):
+            redisdb = redisdb.node_for(name)
+        if not redisdb.execute("HMSET", name, *_flatten_items(dico, kwargs.get('codec'))) == b'OK':
             raise InitializationError("Could not initialize hash on database")
-        return cls(name, redisdb)
+        return cls(name, redisdb, **kwargs)
 
     def __setitem__(self, key: object, value: object) -> bool:
         """
@@ -58,30 +344,41 @@ class dict(RedisType):
         :param value: object
         :return: boolean
         """
-        command = "HSET {} {} {}".format(self._name, key, value)
-        return self._db.execute(command) == 0
+        self._invalidate(key)
+        value = self._encode_value(value)
+        if self._buffered:
+            return self._buffer(key, value)
+        return self._execute("HSET", self._name, key, value,
+                             transform=self._invalidating((key,), lambda reply: reply == 0))
 
     def __getitem__(self, item: object) -> object:
         """
         :param item: object
         :return: object
         """
-        command = "HGET {} {}".format(self._name, item)
-        return _retype(self._db.execute(command))
+        if self._pending:
+            value = self._pending_value(item)
+            if value is not MISSING:
+                return None if value is _DELETED else value
+        if self._cached():
+            field = encode(item)
+            value = self._cache.get(field)
+            if value is MISSING:
+                generation = self._cache.generation
+                value = self._execute("HGET", self._name, item,
+                                      transform=lambda reply: _ABSENT if reply is None else self._values.decode(reply))
+                self._cache.set(field, value, generation)
+            return None if value is _ABSENT else value
+        return self._execute("HGET", self._name, item, transform=self._values.decode)
 
     def __repr__(self) -> str:
         """
         :return: string
         """
-        command = "HGETALL {}".format(self._name)
-        result = self._db.execute(command)
-        dico = {}
-        for index, item in enumerate(result):
-            if index % 2 == 0:
-                key = _retype(item)
-            else:
-                dico[key] = _retype(item)
-        return str(dico)
+        if self._pending:
+            self.flush()
+        result = self._execute("HGETALL", self._name, deferrable=False)
+        return str(std_dict(self._decode_pairs(result)))
 
     def __str__(self) -> str:
         """
@@ -94,72 +391,129 @@ class dict(RedisType):
         :param key: object
         :return: boolean
         """
-        command = "HDEL {} {}".format(self._name, key)
-        return self._db.execute(command) == 0
+        self._invalidate(key)
+        if self._buffered:
+            return self._buffer(key, _DELETED)
+        return self._execute("HDEL", self._name, key,
+                             transform=self._invalidating((key,), lambda reply: reply == 0))
 
     def __contains__(self, item: object) -> bool:
         """
         :param item: object
         :return: boolean
         """
-        command = "HEXISTS {} {}".format(self._name, item)
-        return self._db.execute(command) == 1
+        if self._pending:
+            value = self._pending_value(item)
+            if value is not MISSING:
+                return value is not _DELETED
+        if self._cached():
+            value = self._cache.get(encode(item))
+            if value is not MISSING:
+                return value is not _ABSENT
+        return self._execute("HEXISTS", self._name, item, transform=lambda reply: reply == 1, deferrable=False)
 
     def __len__(self) -> int:
         """
         :return: int
         """
-        command = "HLEN {}".format(self._name)
-        return self._db.execute(command)
+        if self._pending:
+            self.flush()
+        return self._execute("HLEN", self._name, deferrable=False)
 
     def __del__(self) -> bool:
         """
         :return: boolean
         """
-        command = "DEL {}".format(self._name)
-        return self._db.execute(command) == 0
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        # The hash is dropped, buffered writes with it
+        self._pending = {}
+        self._flushing = {}
+        if self._subscription is not None:
+            self._subscription.close()
+        if self._cache is not None:
+            self._cache.clear()
+        return self._execute("DEL", self._name, transform=lambda reply: reply == 0)
 
     def __iter__(self) -> Generator:
         """
+        Streams the keys with HSCAN, see scan
         :return: object
         """
-        command = "HKEYS {}".format(self._name)
-        keys = self._db.execute(command)
-        for key in [_retype(key) for key in keys]:
+        for key, _ in self.scan():
             yield key
 
+    def scan(self, count: int=None, match: str=None) -> Generator:
+        """
+        Streams decoded (key, value) pairs with HSCAN, fetching about count fields per
+        round trip, so that client memory stays constant and the server is never blocked
+        on a whole hash. As per HSCAN guarantees, a field may be yielded more than once
+        if the hash is modified during the iteration.
+        :param count: int, HSCAN COUNT hint, defaults to SCAN_COUNT
+        :param match: str, glob style pattern filtering the keys
+        :return: generator of (key, value) tuples
+        """
+        if self._pending:
+            self.flush()
+        args = ["COUNT", count or self.SCAN_COUNT]
+        if match is not None:
+            args += ["MATCH", match]
+        cursor = b'0'
+        while True:
+            cursor, items = self._execute("HSCAN", self._name, cursor, *args, deferrable=False)
+            yield from self._decode_pairs(items)
+            if cursor in (b'0', 0):
+                break
+
+    def iterkeys(self, count: int=None, match: str=None) -> Generator:
+        """
+        :param count: int, HSCAN COUNT hint
+        :param match: str, glob style pattern filtering the keys
+        :return: generator
+        """
+        for key, _ in self.scan(count, match):
+            yield key
+
+    def itervalues(self, count: int=None, match: str=None) -> Generator:
+        """
+        :param count: int, HSCAN COUNT hint
+        :param match: str, glob style pattern filtering the keys
+        :return: generator
+        """
+        for _, value in self.scan(count, match):
+            yield value
+
+    def iteritems(self, count: int=None, match: str=None) -> Generator:
+        """
+        :param count: int, HSCAN COUNT hint
+        :param match: str, glob style pattern filtering the keys
+        :return: generator of (key, value) tuples
+        """
+        return self.scan(count, match)
+
     def keys(self) -> std_list:
         """
         :return: list
         """
-        command = "HKEYS {}".format(self._name)
-        keys = self._db.execute(command)
-        keys = [_retype(key) for key in keys]
-        return keys
+        if self._pending:
+            self.flush()
+        return self._execute("HKEYS", self._name, transform=self._decoder.decode_many)
 
     def values(self) -> std_list:
         """
         :return: list
         """
-        command = "HVALS {}".format(self._name)
-        values = self._db.execute(command)
-        values = [_retype(value) for value in values]
-        return values
+        if self._pending:
+            self.flush()
+        return self._execute("HVALS", self._name, transform=self._values.decode_many)
 
     def items(self) -> std_list:
         """
         :return: list
         """
-        command = "HGETALL {}".format(self._name)
-        result = self._db.execute(command)
-        items = []
-        for index, item in enumerate(result):
-            if index % 2 == 0:
-                key = _retype(item)
-            else:
-                value = _retype(item)
-                items.append((key, value))
-        return items
+        if self._pending:
+            self.flush()
+        return self._execute("HGETALL", self._name, transform=self._decode_pairs)
 
     def update(self, dico: std_dict) -> bool:
         """
@@ -170,43 +524,444 @@ class dict(RedisType):
             raise TypeError("Please provide a correct dictionary object.")
         if len(dico) == 0:
             return True
-        command = "HMSET {}".format(self._name)
-        for key in dico.keys():
-            command += " {} {}".format(key, dico.get(key))
-        return self._db.execute(command) == b'OK'
+        for key in dico:
+            self._invalidate(key)
+        if self._buffered:
+            for key, value in dico.items():
+                self._buffer(key, self._encode_value(value))
+            return True
+        return self._execute("HMSET", self._name, *_flatten_items(dico, self._codec),
+                             transform=self._invalidating(std_list(dico), lambda reply: reply == b'OK'))
+
+    def get_many(self, keys: Iterable, default: object=None) -> std_dict:
+        """
+        Reads several fields in one atomic HMGET, or one HMGET per BULK_CHUNK
+        fields sent in a single round trip for bigger inputs. Runs right away,
+        an active pipeline is flushed first.
+        :param keys: iterable
+        :param default: object, value of the missing fields
+        :return: dict
+        """
+        keys = std_list(keys)
+        if not keys:
+            return {}
+        if self._pending:
+            self.flush()
+
+        def transform(reply):
+            values = self._values.decode_many(reply)
+            return {key: default if raw is None else value for key, raw, value in zip(keys, reply, values)}
+        if len(keys) <= self.BULK_CHUNK:
+            return self._execute("HMGET", self._name, *keys, transform=transform, deferrable=False)
+        replies = self._execute_chunks([("HMGET", self._name) + tuple(chunk)
+                                        for chunk in _chunks(keys, self.BULK_CHUNK)])
+        return transform(std_list(chain.from_iterable(replies)))
+
+    def set_many(self, mapping: std_dict) -> int:
+        """
+        Writes several fields with variadic HSET, one per BULK_CHUNK fields sent in a single
+        round trip. Bypasses the write buffer, which is flushed first, and runs right away,
+        an active pipeline is flushed first too.
+        :param mapping: dict
+        :return: int, number of fields created
+        """
+        if not isinstance(mapping, Dict):
+            raise TypeError("Please provide a correct dictionary object.")
+        if not mapping:
+            return 0
+        if self._pending:
+            self.flush()
+        for key in mapping:
+            self._invalidate(key)
+        args = _flatten_items(mapping, self._codec)
+        if len(mapping) <= self.BULK_CHUNK:
+            return self._execute("HSET", self._name, *args, transform=self._invalidating(std_list(mapping)),
+                                 deferrable=False)
+        created = sum(self._execute_chunks([("HSET", self._name) + tuple(chunk)
+                                            for chunk in _chunks(args, 2 * self.BULK_CHUNK)]))
+        for key in mapping:
+            self._invalidate(key)
+        return created
+
+    def delete_many(self, keys: Iterable) -> int:
+        """
+        Deletes several fields with variadic HDEL, one per BULK_CHUNK fields sent in a single
+        round trip. Bypasses the write buffer, which is flushed first, and runs right away,
+        an active pipeline is flushed first too.
+        :param keys: iterable
+        :return: int, number of fields deleted
+        """
+        keys = std_list(keys)
+        if not keys:
+            return 0
+        if self._pending:
+            self.flush()
+        for key in keys:
+            self._invalidate(key)
+        if len(keys) <= self.BULK_CHUNK:
+            return self._execute("HDEL", self._name, *keys, transform=self._invalidating(keys), deferrable=False)
+        deleted = sum(self._execute_chunks([("HDEL", self._name) + tuple(chunk)
+                                            for chunk in _chunks(keys, self.BULK_CHUNK)]))
+        for key in keys:
+            self._invalidate(key)
+        return deleted
+
+    def incr_many(self, increments: std_dict) -> std_dict:
+        """
+        Atomically increments several integer fields, missing ones start from 0
+        :param increments: dict of key: int
+        :return: dict of key: new value
+        """
+        if not increments:
+            return {}
+        if self._pending:
+            self.flush()
+        for key in increments:
+            self._invalidate(key)
+        keys = std_list(increments)
+        return self._script("RedisTypes.dict.incr_many", _INCR_MANY, _flatten_items(increments),
+                            transform=self._invalidating(keys, lambda reply: std_dict(zip(keys, reply))))
+
+    def setdefault_many(self, defaults: std_dict) -> std_dict:
+        """
+        Atomically sets the missing fields to their default and reads every field
+        :param defaults: dict of key: default value
+        :return: dict of key: value
+        """
+        if not defaults:
+            return {}
+        if self._pending:
+            self.flush()
+        for key in defaults:
+            self._invalidate(key)
+        keys = std_list(defaults)
+        return self._script("RedisTypes.dict.setdefault_many", _SETDEFAULT_MANY,
+                            _flatten_items(defaults, self._codec),
+                            transform=self._invalidating(
+                                keys, lambda reply: std_dict(zip(keys, self._values.decode_many(reply)))))
+
+    def compare_and_set(self, key: object, expected: object, value: object) -> bool:
+        """
+        Atomically sets key to value if it currently holds expected, or is missing when expected is None
+        :param key: object
+        :param expected: object
+        :param value: object
+        :return: boolean, True if the value was set
+        """
+        if self._pending:
+            self.flush()
+        self._invalidate(key)
+        if expected is None:
+            return self._execute("HSETNX", self._name, key, self._encode_value(value),
+                                 transform=self._invalidating((key,), lambda reply: reply == 1), deferrable=False)
+        return self._script("RedisTypes.dict.compare_and_set", _COMPARE_AND_SET,
+                            (key, self._encode_value(expected), self._encode_value(value)),
+                            transform=self._invalidating((key,), lambda reply: reply == 1))
+
+
+def _popped(reply):
+    if reply is None:
+        raise IndexError("pop from empty list")
+    return reply
 
 
 class list(RedisType):
     """
-    TODO
     http://redis.io/commands#list
+    Items are never fetched all at once unless asked for with a slice or repr,
+    iteration goes through LRANGE pages of CHUNK_SIZE items.
     """
+    # Items fetched per LRANGE round trip by the streaming iterator
+    CHUNK_SIZE = 100
+    # Items sent per RPUSH by extend
+    PUSH_BATCH = 1000
+
     @classmethod
-    def fromlist(cls, name, redisdb, lst):
-        command = "RPUSH {}".format(name)
-        for item in lst:
-            command += " {}".format(item)
-        redisdb.execute(command) == b'OK'
-        return cls(name, redisdb)
+    def fromlist(cls, name: str, redisdb: RedisDB, lst: Iterable, **kwargs) -> std_list:
+        """
+        Generates a tcutils.RedisTypes.list from an iterable, appending to any existing list
+        :param name: str
+        :param redisdb: RedisDB.RedisDB
+        :param lst: iterable
+        :param kwargs: passed to the constructor
+        :return: tcutils.RedisTypes.list
+        """
+        result = cls(name, redisdb, **kwargs)
+        result.extend(lst)
+        return result
 
-    def append(self, item):
-        command = "RPUSH {}".format(self._name)
-        return self._db.execute(command) == 0
+    def append(self, item: object) -> int:
+        """
+        :param item: object
+        :return: int, new length of the list
+        """
+        return self._execute("RPUSH", self._name, self._encode_value(item))
 
-    def update(self, iterable: Iterable):
+    def appendleft(self, item: object) -> int:
+        """
+        :param item: object
+        :return: int, new length of the list
+        """
+        return self._execute("LPUSH", self._name, self._encode_value(item))
+
+    def extend(self, iterable: Iterable):
+        """
+        Appends the items with one RPUSH per PUSH_BATCH items, the iterable is consumed lazily
+        :param iterable: iterable
+        """
         if not isinstance(iterable, Iterable):
-            TypeError("Please provide a valid iterable object.")
-        if len(iterable) == 0:
-            return True
-        command = "RPUSH {}".format(self._name)
-        for item in iterable:
-            command += " {}".format(item)
-        return self._db.execute(command) == b'OK'
+            raise TypeError("Please provide a valid iterable object.")
+        iterator = iter(iterable)
+        while True:
+            chunk = std_list(islice(iterator, self.PUSH_BATCH))
+            if self._codec is not None:
+                chunk = std_list(map(self._codec.encode, chunk))
+            if not chunk:
+                break
+            self._execute("RPUSH", self._name, *chunk)
+
+    def update(self, iterable: Iterable):
+        """
+        Same as extend, kept for backward compatibility
+        :param iterable: iterable
+        """
+        self.extend(iterable)
+
+    def __len__(self) -> int:
+        """
+        :return: int
+        """
+        return self._execute("LLEN", self._name, deferrable=False)
+
+    def __getitem__(self, index):
+        """
+        :param index: int or slice
+        :return: object, or list for a slice
+        """
+        if isinstance(index, slice):
+            return self._slice(index)
+        return self._execute("LINDEX", self._name, index, transform=self._decode_index)
+
+    def _decode_index(self, reply):
+        if reply is None:
+            raise IndexError("list index out of range")
+        return self._values.decode(reply)
+
+    def _slice(self, index: slice):
+        if index.step not in (None, 1):
+            start, stop, step = index.indices(len(self))
+            if not range(start, stop, step):
+                return []
+            decode = self._values.decode_many
+            if step > 0:
+                return self._execute("LRANGE", self._name, start, stop - 1,
+                                     transform=lambda reply: decode(reply)[::step])
+            return self._execute("LRANGE", self._name, stop + 1, start,
+                                 transform=lambda reply: decode(reply)[::-1][::-step])
+        start = 0 if index.start is None else index.start
+        # LRANGE stops are inclusive
+        if index.stop is None:
+            stop = -1
+        elif index.stop == 0:
+            return []
+        else:
+            stop = index.stop - 1
+        return self._execute("LRANGE", self._name, start, stop, transform=self._values.decode_many)
+
+    def __setitem__(self, index: int, value: object) -> bool:
+        """
+        :param index: int
+        :param value: object
+        :return: boolean
+        """
+        return self._execute("LSET", self._name, index, self._encode_value(value), transform=lambda reply: reply == b'OK')
+
+    def __iter__(self) -> Generator:
+        """
+        Streams the items with LRANGE, see iterate
+        :return: object
+        """
+        return self.iterate()
+
+    def iterate(self, chunk_size: int=None) -> Generator:
+        """
+        Streams the items, chunk_size at a time
+        :param chunk_size: int, items per LRANGE round trip, defaults to CHUNK_SIZE
+        :return: generator
+        """
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        start = 0
+        while True:
+            chunk = self._execute("LRANGE", self._name, start, start + chunk_size - 1, deferrable=False)
+            yield from self._values.decode_many(chunk)
+            if len(chunk) < chunk_size:
+                break
+            start += chunk_size
+
+    def __repr__(self) -> str:
+        """
+        :return: string
+        """
+        return str(self._values.decode_many(self._execute("LRANGE", self._name, 0, -1, deferrable=False)))
+
+    def __str__(self) -> str:
+        """
+        :return: string
+        """
+        return self.__repr__()
+
+    def pop(self) -> object:
+        """
+        Removes and returns the last item
+        :return: object
+        """
+        return self._execute("RPOP", self._name, transform=lambda reply: self._values.decode(_popped(reply)))
+
+    def popleft(self) -> object:
+        """
+        Removes and returns the first item
+        :return: object
+        """
+        return self._execute("LPOP", self._name, transform=lambda reply: self._values.decode(_popped(reply)))
+
+    def bpop(self, timeout: float=0) -> object:
+        """
+        Removes and returns the last item, waiting for one to be pushed if the list is empty.
+        The connection is held meanwhile: use a pooled RedisDB to share it with other users.
+        :param timeout: float, seconds to wait, 0 waits forever
+        :return: object, None on timeout
+        """
+        return self._execute("BRPOP", self._name, timeout, transform=self._decode_blocking, deferrable=False)
+
+    def bpopleft(self, timeout: float=0) -> object:
+        """
+        Removes and returns the first item, waiting for one to be pushed if the list is empty,
+        see bpop. With append, it makes the list a FIFO work queue.
+        :param timeout: float, seconds to wait, 0 waits forever
+        :return: object, None on timeout
+        """
+        return self._execute("BLPOP", self._name, timeout, transform=self._decode_blocking, deferrable=False)
+
+    def _decode_blocking(self, reply):
+        # Blocking pops reply with a [key, item] pair, or nil on timeout
+        return None if reply is None else self._values.decode(reply[1])
+
+
+class ShardedDict:
+    """
+    Hash whose fields are spread over the nodes of a sharding.ShardedRedisDB, each node
+    holding a regular hash of the same name. Single field operations go to the node owning
+    the field, whole hash operations fan out to every node in parallel and merge the results.
+    """
+    def __init__(self, name: str, redisdb: ShardedRedisDB, decoder: Decoder=TEXT, codec: Codec=None):
+        """
+        :param name: str
+        :param redisdb: sharding.ShardedRedisDB
+        :param decoder: decoders.Decoder used on replies
+        :param codec: serializers.Codec used on values
+        """
+        if not isinstance(redisdb, ShardedRedisDB):
+            raise TypeError("Please provide a correct ShardedRedisDB.")
+        self._name = name
+        self._db = redisdb
+        self._decoder = decoder
+        self._codec = codec
+        self._shards = {}
+
+    def _shard_on(self, node: RedisDB) -> dict:
+        shard = self._shards.get(id(node))
+        if shard is None:
+            shard = self._shards[id(node)] = dict(self._name, node, self._decoder, self._codec)
+        return shard
+
+    def _shard(self, key: object) -> dict:
+        return self._shard_on(self._db.node_for(key))
+
+    def _all_shards(self) -> std_list:
+        return [self._shard_on(node) for node in self._db.nodes]
+
+    def __setitem__(self, key: object, value: object) -> bool:
+        return self._shard(key).__setitem__(key, value)
+
+    def __getitem__(self, item: object) -> object:
+        return self._shard(item)[item]
+
+    def __delitem__(self, key: object) -> bool:
+        return self._shard(key).__delitem__(key)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._shard(item)
+
+    def __len__(self) -> int:
+        return sum(self._db.map(len, self._all_shards()))
+
+    def __iter__(self) -> Generator:
+        for shard in self._all_shards():
+            yield from shard
+
+    def keys(self) -> std_list:
+        return [key for keys in self._db.map(dict.keys, self._all_shards()) for key in keys]
+
+    def values(self) -> std_list:
+        return [value for values in self._db.map(dict.values, self._all_shards()) for value in values]
+
+    def items(self) -> std_list:
+        return [item for items in self._db.map(dict.items, self._all_shards()) for item in items]
+
+    def __repr__(self) -> str:
+        return str(std_dict(self.items()))
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def update(self, dico: std_dict) -> bool:
+        """
+        Groups the fields per node and updates every node in parallel
+        :param dico: dict
+        :return: boolean
+        """
+        if not isinstance(dico, Dict):
+            raise TypeError("Please provide a correct dictionary object.")
+        groups = {}
+        for key, value in dico.items():
+            shard = self._shard(key)
+            groups.setdefault(id(shard), (shard, {}))[1][key] = value
+        return all(self._db.map(lambda group: group[0].update(group[1]), groups.values()))
+
+    def rebalance(self, nodes: Iterable=None) -> int:
+        """
+        Moves the fields not stored on their owning node, after nodes were added or removed
+        A field the owner already holds was written after the change: it is kept, and the
+        stale copy is only deleted.
+        :param nodes: iterable of RedisDB.RedisDB to scan, defaults to the current nodes,
+         pass a removed node to drain it
+        :return: int, number of fields moved
+        """
+        def move(node):
+            moved = 0
+            cursor = b'0'
+            while True:
+                cursor, items = node.execute("HSCAN", self._name, cursor, "COUNT", dict.SCAN_COUNT)
+                groups = {}
+                for index in range(0, len(items), 2):
+                    owner = self._db.node_for(items[index])
+                    if owner is not node:
+                        groups.setdefault(id(owner), (owner, []))[1].extend(items[index:index + 2])
+                for owner, args in groups.values():
+                    # A value written to the owner since the node change is newer than this copy
+                    with owner.pipeline() as batch:
+                        for index in range(0, len(args), 2):
+                            batch.execute("HSETNX", self._name, args[index], args[index + 1])
+                    node.execute("HDEL", self._name, *args[0::2])
+                    moved += len(args) // 2
+                if cursor in (b'0', 0):
+                    return moved
+        return sum(self._db.map(move, self._db.nodes if nodes is None else nodes))
 
 
 def testdict():
     db = RedisDB("127.0.0.1")
-    print(_retype(db.execute("ECHO 'Hello'")))
+    print(TEXT.decode(db.execute("ECHO 'Hello'")))
     dico = {
         "TYPEMAGASIN": 0,
         "NUMEROTICKET": 1,
@@ -232,7 +987,16 @@ def testdict():
 
 def testlist():
     db = RedisDB("127.0.0.1")
-    print(_retype(db.execute("ECHO 'Hello'")))
+    print(TEXT.decode(db.execute("ECHO 'Hello'")))
+    lst = list.fromlist("TICKETS", db, range(10))
+    print(lst)
+    lst.append(10)
+    print(len(lst))
+    print(lst[0], lst[-1], lst[2:5], lst[::3])
+    print(lst.pop(), lst.popleft())
+    for item in lst:
+        print(item)
+    print(lst.bpopleft(timeout=1))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,310 @@
+"""
+asyncio counterparts of RedisDB, RedisTypes.dict and RedisTypes.list
+Commands are multiplexed: many coroutines may have commands in flight on the same
+connection, replies are matched to them in order, so gather over a few connections
+does not need one socket per pending command.
+"""
+import asyncio
+from collections import deque
+from itertools import count as counter
+from typing import AsyncGenerator, Dict, Iterable
+
+from redis import ResponseError
+
+from RedisTypes.RedisDB import _command_args
+from RedisTypes.decoders import Decoder, TEXT
+from RedisTypes.resp import pack_command, pack_commands
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """
+    Reads one RESP reply, error replies are returned as redis.ResponseError instances
+    :param reader: asyncio.StreamReader
+    :return: object
+    """
+    line = await reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError("Connection closed by server.")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'$':
+        length = int(payload)
+        if length == -1:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b':':
+        return int(payload)
+    if kind == b'+':
+        return payload
+    if kind == b'*':
+        length = int(payload)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    if kind == b'-':
+        return ResponseError(payload.decode(errors='replace'))
+    raise ConnectionError("Protocol error, unexpected reply {}.".format(line))
+
+
+class AsyncConnection:
+    """
+    A single multiplexed connection, a reader task resolves the pending futures in order
+    """
+    def __init__(self, host, port):
+        self._host = host
+        self._port = port
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._waiters = deque()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self._host, self._port)
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+
+    async def _read_loop(self):
+        try:
+            while True:
+                reply = await read_reply(self._reader)
+                waiter = self._waiters.popleft()
+                if waiter.cancelled():
+                    continue
+                if isinstance(reply, ResponseError):
+                    waiter.set_exception(reply)
+                else:
+                    waiter.set_result(reply)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError) as error:
+            self._abort(ConnectionError("Connection to {}:{} lost: {}".format(self._host, self._port, error)))
+        except Exception as error:
+            # Malformed reply, the stream can't be resynchronized
+            self._abort(error)
+
+    def _abort(self, error):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(error)
+
+    def _send(self, packed: bytes, replies: int) -> list:
+        # Queuing the futures and writing is synchronous, so replies stay in order
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in range(replies)]
+        self._waiters.extend(futures)
+        self._writer.write(packed)
+        return futures
+
+    async def execute(self, args):
+        future = self._send(pack_command(args), 1)[0]
+        await self._writer.drain()
+        return await future
+
+    async def execute_many(self, commands) -> list:
+        futures = self._send(pack_commands(commands), len(commands))
+        await self._writer.drain()
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._abort(ConnectionError("Connection closed."))
+
+
+class AsyncRedisDB:
+    DEFAULTPORT = 6379
+
+    def __init__(self, host, port=DEFAULTPORT, connections: int=1):
+        """
+        Connections are opened on first use
+        :param host: str
+        :param port: int
+        :param connections: int, number of multiplexed connections, used round robin
+        """
+        if connections < 1:
+            raise ValueError("At least one connection is needed.")
+        self._host = host
+        self._port = port
+        self._connections = [AsyncConnection(host, port) for _ in range(connections)]
+        self._next = counter()
+        self._connect_lock = None
+
+    async def _connection(self) -> AsyncConnection:
+        connection = self._connections[next(self._next) % len(self._connections)]
+        if not connection.connected:
+            if self._connect_lock is None:
+                self._connect_lock = asyncio.Lock()
+            async with self._connect_lock:
+                if not connection.connected:
+                    await connection.connect()
+        return connection
+
+    async def execute(self, *args):
+        """
+        :param args: command name and arguments, a single string is split on whitespace
+        :return: object
+        """
+        connection = await self._connection()
+        return await connection.execute(_command_args(args))
+
+    async def execute_many(self, commands) -> list:
+        """
+        Sends several commands in a single write, error replies are returned as exceptions
+        :param commands: list of argument sequences
+        :return: list
+        """
+        connection = await self._connection()
+        return await connection.execute_many([_command_args(args) for args in commands])
+
+    async def close(self):
+        for connection in self._connections:
+            await connection.close()
+
+
+class AsyncRedisType:
+    def __init__(self, name: str, redisdb: AsyncRedisDB, decoder: Decoder=TEXT):
+        """
+        :param name: str
+        :param redisdb: AsyncRedisDB
+        :param decoder: decoders.Decoder used on replies
+        """
+        if not isinstance(redisdb, AsyncRedisDB):
+            raise TypeError("Please provide a correct AsyncRedisDB.")
+        if not isinstance(decoder, Decoder):
+            raise TypeError("Please provide a correct Decoder.")
+        self._name = name
+        self._db = redisdb
+        self._decoder = decoder
+
+
+class AsyncDict(AsyncRedisType):
+    """
+    http://redis.io/commands#hash
+    """
+    SCAN_COUNT = 100
+
+    async def get(self, key: object) -> object:
+        return self._decoder.decode(await self._db.execute("HGET", self._name, key))
+
+    def __getitem__(self, key: object):
+        """
+        :param key: object
+        :return: awaitable
+        """
+        return self.get(key)
+
+    async def set(self, key: object, value: object) -> bool:
+        return await self._db.execute("HSET", self._name, key, value) == 0
+
+    async def delete(self, key: object) -> bool:
+        return await self._db.execute("HDEL", self._name, key) == 0
+
+    async def contains(self, key: object) -> bool:
+        return await self._db.execute("HEXISTS", self._name, key) == 1
+
+    async def len(self) -> int:
+        return await self._db.execute("HLEN", self._name)
+
+    async def keys(self) -> list:
+        return self._decoder.decode_many(await self._db.execute("HKEYS", self._name))
+
+    async def values(self) -> list:
+        return self._decoder.decode_many(await self._db.execute("HVALS", self._name))
+
+    async def items(self) -> list:
+        return self._decoder.decode_pairs(await self._db.execute("HGETALL", self._name))
+
+    async def update(self, dico: Dict) -> bool:
+        if not isinstance(dico, Dict):
+            raise TypeError("Please provide a correct dictionary object.")
+        if len(dico) == 0:
+            return True
+        args = []
+        for item in dico.items():
+            args += item
+        return await self._db.execute("HMSET", self._name, *args) == b'OK'
+
+    async def scan(self, count: int=None, match: str=None) -> AsyncGenerator:
+        """
+        Streams decoded (key, value) pairs with HSCAN, see RedisTypes.dict.scan
+        :param count: int, HSCAN COUNT hint, defaults to SCAN_COUNT
+        :param match: str, glob style pattern filtering the keys
+        :return: async generator of (key, value) tuples
+        """
+        args = ["COUNT", count or self.SCAN_COUNT]
+        if match is not None:
+            args += ["MATCH", match]
+        cursor = b'0'
+        while True:
+            cursor, items = await self._db.execute("HSCAN", self._name, cursor, *args)
+            for pair in self._decoder.decode_pairs(items):
+                yield pair
+            if cursor in (b'0', 0):
+                break
+
+    async def __aiter__(self) -> AsyncGenerator:
+        async for key, _ in self.scan():
+            yield key
+
+
+class AsyncList(AsyncRedisType):
+    """
+    http://redis.io/commands#list
+    """
+    # Items fetched per LRANGE round trip by the streaming iterator
+    CHUNK_SIZE = 100
+
+    async def append(self, item: object) -> int:
+        return await self._db.execute("RPUSH", self._name, item)
+
+    async def extend(self, iterable: Iterable) -> int:
+        items = list(iterable)
+        if not items:
+            return await self.len()
+        return await self._db.execute("RPUSH", self._name, *items)
+
+    async def len(self) -> int:
+        return await self._db.execute("LLEN", self._name)
+
+    async def get(self, index: int) -> object:
+        reply = await self._db.execute("LINDEX", self._name, index)
+        if reply is None:
+            raise IndexError("list index out of range")
+        return self._decoder.decode(reply)
+
+    def __getitem__(self, index: int):
+        """
+        :param index: int
+        :return: awaitable
+        """
+        return self.get(index)
+
+    async def range(self, start: int=0, stop: int=-1) -> list:
+        """
+        :param start: int
+        :param stop: int, inclusive as with LRANGE
+        :return: list
+        """
+        return self._decoder.decode_many(await self._db.execute("LRANGE", self._name, start, stop))
+
+    async def pop(self) -> object:
+        return self._decoder.decode(await self._db.execute("RPOP", self._name))
+
+    async def popleft(self) -> object:
+        return self._decoder.decode(await self._db.execute("LPOP", self._name))
+
+    async def __aiter__(self) -> AsyncGenerator:
+        start = 0
+        while True:
+            chunk = await self.range(start, start + self.CHUNK_SIZE - 1)
+            for item in chunk:
+                yield item
+            if len(chunk) < self.CHUNK_SIZE:
+                break
+            start += self.CHUNK_SIZE
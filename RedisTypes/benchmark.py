@@ -0,0 +1,243 @@
+"""RedisTypes throughput benchmark
+
+Measures RedisDB and RedisTypes.dict operations against the in-process fake server,
+or a local redis-server binary, and reports ops/sec with p50/p99 latencies.
+Bulk load and pipeline time whole batches: their latencies are per operation averages
+over each batch, saved with the batch size.
+
+Usage:
+    benchmark.py [options]
+
+Options:
+    -h --help                           Show this screen
+    -n <nb>, --ops <nb>                 Operations per measurement [default: 2000]
+    -s <sizes>, --sizes <sizes>         Comma separated payload sizes in bytes [default: 16,256,4096]
+    -o <file>, --output <file>          Save the results as JSON to file
+    -c <file>, --compare <file>         Compare with the results saved by a previous run
+    -t <ratio>, --threshold <ratio>     Throughput drop reported as a regression [default: 0.1]
+    --redis-server <path>               Start this redis-server binary on a free port instead of the fake server
+"""
+import json
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from time import perf_counter
+
+from docopt import docopt
+
+from RedisTypes import dict as RedisDict
+from RedisTypes.RedisDB import RedisDB, reachable
+from RedisTypes.fakeserver import FakeRedisServer
+
+# Batches timed by the bulk load and pipeline benchmarks
+BATCHES = 5
+
+
+def percentile(latencies: list, rank: float) -> float:
+    """
+    :param latencies: sorted list of float
+    :param rank: float, between 0 and 100
+    :return: float, nearest rank percentile
+    """
+    index = max(int(round(rank / 100 * len(latencies))) - 1, 0)
+    return latencies[index]
+
+
+def _fields(size: int, ops: int) -> dict:
+    value = b'x' * size
+    return {"field:{}".format(index): value for index in range(ops)}
+
+
+def bench_get(db, size, ops):
+    dico = RedisDict.fromdict("benchmark:get", db, _fields(size, ops))
+    latencies = []
+    for key in _fields(0, ops):
+        start = perf_counter()
+        dico[key]
+        latencies.append(perf_counter() - start)
+    return ops, latencies, 1
+
+
+def bench_set(db, size, ops):
+    dico = RedisDict("benchmark:set", db)
+    latencies = []
+    for key, value in _fields(size, ops).items():
+        start = perf_counter()
+        dico[key] = value
+        latencies.append(perf_counter() - start)
+    return ops, latencies, 1
+
+
+def bench_iterate(db, size, ops):
+    dico = RedisDict.fromdict("benchmark:iterate", db, _fields(size, ops))
+    latencies = []
+    iterator = dico.iteritems()
+    while True:
+        start = perf_counter()
+        try:
+            next(iterator)
+        except StopIteration:
+            break
+        latencies.append(perf_counter() - start)
+    return len(latencies), latencies, 1
+
+
+def bench_bulk_load(db, size, ops):
+    fields = _fields(size, ops)
+    latencies = []
+    for batch in range(BATCHES):
+        dico = RedisDict("benchmark:bulk:{}".format(batch), db)
+        start = perf_counter()
+        dico.set_many(fields)
+        latencies.append(perf_counter() - start)
+    return ops * BATCHES, latencies, ops
+
+
+def bench_pipeline(db, size, ops):
+    fields = _fields(size, ops)
+    latencies = []
+    for batch in range(BATCHES):
+        dico = RedisDict("benchmark:pipeline:{}".format(batch), db)
+        start = perf_counter()
+        with db.pipeline():
+            for key, value in fields.items():
+                dico[key] = value
+        latencies.append(perf_counter() - start)
+    return ops * BATCHES, latencies, ops
+
+
+BENCHMARKS = [
+    ("get", bench_get),
+    ("set", bench_set),
+    ("iterate", bench_iterate),
+    ("bulk_load", bench_bulk_load),
+    ("pipeline", bench_pipeline),
+]
+
+
+def run(db: RedisDB, sizes: list, ops: int) -> list:
+    """
+    :param db: RedisDB.RedisDB
+    :param sizes: list of int, payload sizes in bytes
+    :param ops: int, operations per measurement
+    :return: list of result dicts
+    """
+    results = []
+    for size in sizes:
+        for name, benchmark in BENCHMARKS:
+            done, latencies, batch = benchmark(db, size, ops)
+            seconds = sum(latencies)
+            # One sample per batch of operations, averaged per operation
+            latencies = sorted(latency / batch for latency in latencies)
+            results.append({
+                "name": name,
+                "payload": size,
+                "ops": done,
+                "batch": batch,
+                "seconds": seconds,
+                "ops_per_sec": done / seconds if seconds else float('inf'),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+            })
+            print("{name:>10} {payload:>6}B {ops_per_sec:>12.0f} ops/s  p50 {p50_ms:.3f}ms  p99 {p99_ms:.3f}ms"
+                  .format(**results[-1]))
+    return results
+
+
+def compare(results: list, previous: list, threshold: float) -> list:
+    """
+    Prints the throughput ratio of each benchmark to its previous result
+    :param results: list of result dicts
+    :param previous: list of result dicts
+    :param threshold: float, relative throughput drop counted as a regression
+    :return: list of (name, payload, ratio) regressions
+    """
+    before = {(result["name"], result["payload"]): result for result in previous}
+    regressions = []
+    for result in results:
+        old = before.get((result["name"], result["payload"]))
+        if old is None:
+            continue
+        ratio = result["ops_per_sec"] / old["ops_per_sec"]
+        regressed = ratio < 1 - threshold
+        print("{:>10} {:>6}B {:>7.2f}x{}".format(result["name"], result["payload"], ratio,
+                                                 "  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append((result["name"], result["payload"], ratio))
+    return regressions
+
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_redis_server(path: str):
+    """
+    Starts a throwaway redis-server without persistence on a free port
+    :param path: str, redis-server binary
+    :return: (subprocess.Popen, (host, port))
+    """
+    address = ("127.0.0.1", _free_port())
+    process = subprocess.Popen([path, "--port", str(address[1]), "--save", "", "--appendonly", "no"],
+                               stdout=subprocess.DEVNULL)
+    for _ in range(50):
+        if reachable(*address, ttl=0):
+            return process, address
+        time.sleep(.1)
+    process.kill()
+    raise RuntimeError("{} did not start.".format(path))
+
+
+def main(arguments):
+    ops = int(arguments["--ops"])
+    sizes = [int(size) for size in arguments["--sizes"].split(",")]
+    if arguments["--redis-server"]:
+        process, address = start_redis_server(arguments["--redis-server"])
+        server = None
+    else:
+        server = FakeRedisServer().start()
+        process, address = None, server.address
+    try:
+        results = run(RedisDB(*address), sizes, ops)
+    finally:
+        if server is not None:
+            server.stop()
+        if process is not None:
+            process.terminate()
+
+    if arguments["--output"]:
+        with open(arguments["--output"], 'w') as output:
+            json.dump({
+                "meta": {
+                    "date": datetime.now().isoformat(),
+                    "commit": _commit(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "server": "redis-server" if process is not None else "fake",
+                    "ops": ops,
+                },
+                "results": results,
+            }, output, indent=2)
+
+    if arguments["--compare"]:
+        with open(arguments["--compare"]) as previous:
+            regressions = compare(results, json.load(previous)["results"], float(arguments["--threshold"]))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+MISSING = object()
+
+
+class LocalCache:
+    """
+    Bounded, thread safe LRU cache with an optional time to live,
+    used by RedisTypes to answer repeated reads without a round trip
+    Every invalidation bumps the cache generation: a value read from the server is only
+    stored if no invalidation happened since the read was issued, see set.
+    """
+    def __init__(self, maxsize: int=1024, ttl: float=None):
+        """
+        :param maxsize: int, number of entries kept before evicting the least recently used
+        :param ttl: float, seconds an entry stays valid, None keeps it until evicted
+        """
+        if maxsize < 1:
+            raise ValueError("Cache size should be at least 1.")
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        :param key: hashable
+        :return: the cached value, or cache.MISSING
+        """
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is not MISSING:
+                value, expires = entry
+                if expires is None or expires > monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    @property
+    def generation(self) -> int:
+        """
+        :return: int, number of invalidations so far
+        """
+        return self._generation
+
+    def set(self, key, value, generation: int=None) -> bool:
+        """
+        :param key: hashable
+        :param value: object
+        :param generation: int, generation read before fetching value, it is dropped if outdated
+        :return: bool, whether value was stored
+        """
+        expires = None if self._ttl is None else monotonic() + self._ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, key):
+        """
+        :param key: hashable
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,98 @@
+"""
+Reply decoders for RedisTypes
+A decoder turns raw replies (bytes, int or None) into python objects, either one
+at a time with decode or a whole multi-bulk reply at once with decode_many.
+"""
+
+
+class Decoder:
+    def decode(self, value):
+        """
+        :param value: bytes, int or None
+        :return: object
+        """
+        raise NotImplementedError
+
+    def decode_many(self, values) -> list:
+        """
+        :param values: list of replies
+        :return: list
+        """
+        return list(map(self.decode, values))
+
+    def decode_pairs(self, values) -> list:
+        """
+        Decodes a flat [key, value, key, value...] reply, as sent by HGETALL
+        :param values: list of replies
+        :return: list of (key, value) tuples
+        """
+        decoded = iter(self.decode_many(values))
+        return list(zip(decoded, decoded))
+
+
+class RawDecoder(Decoder):
+    """
+    Leaves replies untouched, values come back as bytes
+    """
+    def decode(self, value):
+        return value
+
+    def decode_many(self, values) -> list:
+        return list(values)
+
+
+class TextDecoder(Decoder):
+    """
+    Decodes bytes replies as text, integer looking ones are returned as int
+    Unless an error handler is given, replies that are not valid text in the encoding
+    are returned as bytes, so that binary values stay readable.
+    """
+    def __init__(self, encoding: str='utf-8', errors: str=None, parse_int: bool=True):
+        """
+        :param encoding: str
+        :param errors: str, bytes.decode error handler, None returns undecodable replies as bytes
+        :param parse_int: bool, return int for replies made of digits (with an optional minus sign)
+        """
+        self._encoding = encoding
+        self._errors = errors
+        self._parse_int = parse_int
+
+    def _text(self, value: bytes):
+        if self._errors is not None:
+            return value.decode(self._encoding, self._errors)
+        try:
+            return value.decode(self._encoding)
+        except UnicodeDecodeError:
+            return value
+
+    def decode(self, value):
+        if type(value) is not bytes:
+            return value
+        if self._parse_int and (value.isdigit() or value[:1] == b'-' and value[1:].isdigit()):
+            return int(value)
+        return self._text(value)
+
+    def decode_many(self, values) -> list:
+        if not self._parse_int:
+            encoding, errors = self._encoding, self._errors or 'strict'
+            try:
+                return [value.decode(encoding, errors) if type(value) is bytes else value for value in values]
+            except UnicodeDecodeError:
+                # Rare binary values, decode one by one to keep them as bytes
+                text = self._text
+                return [text(value) if type(value) is bytes else value for value in values]
+        decoded = []
+        append = decoded.append
+        text = self._text
+        for value in values:
+            if type(value) is not bytes:
+                append(value)
+            elif value.isdigit() or value[:1] == b'-' and value[1:].isdigit():
+                append(int(value))
+            else:
+                append(text(value))
+        return decoded
+
+
+RAW = RawDecoder()
+TEXT = TextDecoder()
@@ -0,0 +1,357 @@
+"""
+In-process stand-in for a Redis server, speaking RESP over TCP
+It implements the string, hash and list commands used by RedisTypes, enough to run
+RedisDB and the containers without a real server (benchmarks, CI). There is no Lua,
+blocking or pub/sub support: EVALSHA/SCRIPT, BLPOP/BRPOP and SUBSCRIBE reply with an
+unknown command error, so dict.incr_many, setdefault_many, compare_and_set with an
+expected value, list.bpop, bpopleft and dict.listen_invalidations need a real server.
+Everything lives in memory and is serialized by a single lock. An HSCAN cursor walks
+a snapshot of the field order, so that fields present during the whole iteration are
+always returned.
+"""
+import socketserver
+import threading
+from collections import OrderedDict
+from itertools import count as counter
+from fnmatch import fnmatchcase
+
+
+class CommandError(Exception):
+    pass
+
+
+class _Status(bytes):
+    """Simple string reply, e.g. +OK"""
+
+
+OK = _Status(b'OK')
+PONG = _Status(b'PONG')
+
+
+def encode_reply(reply) -> bytes:
+    """
+    :param reply: None, int, bytes, list or CommandError
+    :return: bytes, the RESP framed reply
+    """
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, _Status):
+        return b'+' + reply + b'\r\n'
+    if isinstance(reply, bytes):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, list):
+        return b'*%d\r\n' % len(reply) + b''.join(encode_reply(item) for item in reply)
+    if isinstance(reply, CommandError):
+        return b'-' + str(reply).encode() + b'\r\n'
+    raise TypeError("Can't encode reply {!r}.".format(reply))
+
+
+def _int(value: bytes) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise CommandError("ERR value is not an integer or out of range")
+
+
+class FakeRedis:
+    """
+    Command interpreter over an in-memory keyspace
+    """
+    # Unfinished HSCAN iterations kept, the oldest are dropped past it
+    MAX_SCANS = 1024
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        # cursor: fields left to return by that HSCAN iteration
+        self._scans = OrderedDict()
+        self._cursors = counter(1)
+
+    def execute(self, args: list):
+        """
+        :param args: list of bytes, command name first
+        :return: reply, see encode_reply
+        """
+        handler = getattr(self, 'cmd_' + args[0].decode(errors='replace').lower(), None)
+        if handler is None:
+            return CommandError("ERR unknown command '{}'".format(args[0].decode(errors='replace')))
+        with self._lock:
+            try:
+                return handler(*args[1:])
+            except CommandError as error:
+                return error
+            except TypeError:
+                return CommandError("ERR wrong number of arguments for '{}' command".format(args[0].decode()))
+
+    def _get(self, key: bytes, kind: type):
+        value = self._data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    # Connection and keyspace
+
+    def cmd_ping(self, message=None):
+        return PONG if message is None else message
+
+    def cmd_echo(self, message):
+        return message
+
+    def cmd_select(self, index):
+        return OK
+
+    def cmd_flushdb(self):
+        self._data.clear()
+        return OK
+
+    def cmd_del(self, *keys):
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def cmd_exists(self, *keys):
+        return sum(key in self._data for key in keys)
+
+    # Strings
+
+    def cmd_get(self, key):
+        return self._get(key, bytes)
+
+    def cmd_set(self, key, value):
+        self._data[key] = value
+        return OK
+
+    # Hashes
+
+    def _hash(self, key: bytes, create: bool=False) -> dict:
+        value = self._get(key, dict)
+        if value is None:
+            value = {}
+            if create:
+                self._data[key] = value
+        return value
+
+    def _drop_empty(self, key: bytes):
+        if not self._data.get(key, True):
+            del self._data[key]
+
+    def cmd_hset(self, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise TypeError
+        hash_ = self._hash(key, True)
+        created = 0
+        for index in range(0, len(pairs), 2):
+            created += pairs[index] not in hash_
+            hash_[pairs[index]] = pairs[index + 1]
+        return created
+
+    def cmd_hmset(self, key, *pairs):
+        self.cmd_hset(key, *pairs)
+        return OK
+
+    def cmd_hsetnx(self, key, field, value):
+        hash_ = self._hash(key, True)
+        if field in hash_:
+            return 0
+        hash_[field] = value
+        return 1
+
+    def cmd_hget(self, key, field):
+        return self._hash(key).get(field)
+
+    def cmd_hmget(self, key, *fields):
+        hash_ = self._hash(key)
+        return [hash_.get(field) for field in fields]
+
+    def cmd_hdel(self, key, *fields):
+        hash_ = self._hash(key)
+        deleted = sum(hash_.pop(field, None) is not None for field in fields)
+        self._drop_empty(key)
+        return deleted
+
+    def cmd_hexists(self, key, field):
+        return int(field in self._hash(key))
+
+    def cmd_hlen(self, key):
+        return len(self._hash(key))
+
+    def cmd_hkeys(self, key):
+        return list(self._hash(key))
+
+    def cmd_hvals(self, key):
+        return list(self._hash(key).values())
+
+    def cmd_hgetall(self, key):
+        return [item for pair in self._hash(key).items() for item in pair]
+
+    def cmd_hincrby(self, key, field, increment):
+        hash_ = self._hash(key, True)
+        value = _int(hash_.get(field, b'0')) + _int(increment)
+        hash_[field] = b'%d' % value
+        return value
+
+    def cmd_hscan(self, key, cursor, *options):
+        count, match = 10, None
+        for index in range(0, len(options) - 1, 2):
+            option = options[index].upper()
+            if option == b'COUNT':
+                count = _int(options[index + 1])
+            elif option == b'MATCH':
+                match = options[index + 1].decode(errors='surrogateescape')
+        hash_ = self._hash(key)
+        cursor = _int(cursor)
+        if cursor == 0:
+            fields = list(hash_)
+        else:
+            # An unknown or dropped cursor ends the iteration
+            fields = self._scans.pop(cursor, [])
+        page, fields = fields[:count], fields[count:]
+        following = 0
+        if fields:
+            following = next(self._cursors)
+            self._scans[following] = fields
+            if len(self._scans) > self.MAX_SCANS:
+                self._scans.popitem(last=False)
+        items = []
+        for field in page:
+            # Fields deleted since the snapshot are skipped
+            if field in hash_ and (match is None or fnmatchcase(field.decode(errors='surrogateescape'), match)):
+                items += (field, hash_[field])
+        return [b'%d' % following, items]
+
+    # Lists
+
+    def _list(self, key: bytes, create: bool=False) -> list:
+        value = self._get(key, list)
+        if value is None:
+            value = []
+            if create:
+                self._data[key] = value
+        return value
+
+    def cmd_rpush(self, key, *items):
+        if not items:
+            raise TypeError
+        list_ = self._list(key, True)
+        list_.extend(items)
+        return len(list_)
+
+    def cmd_lpush(self, key, *items):
+        if not items:
+            raise TypeError
+        list_ = self._list(key, True)
+        list_[:0] = reversed(items)
+        return len(list_)
+
+    def cmd_llen(self, key):
+        return len(self._list(key))
+
+    def cmd_lrange(self, key, start, stop):
+        list_ = self._list(key)
+        start, stop, length = _int(start), _int(stop), len(list_)
+        if start < 0:
+            start = max(length + start, 0)
+        if stop < 0:
+            stop += length
+        if start > stop or start >= length:
+            return []
+        return list_[start:stop + 1]
+
+    def cmd_lindex(self, key, index):
+        list_ = self._list(key)
+        index = _int(index)
+        return list_[index] if -len(list_) <= index < len(list_) else None
+
+    def cmd_lset(self, key, index, value):
+        list_ = self._get(key, list)
+        if list_ is None:
+            raise CommandError("ERR no such key")
+        index = _int(index)
+        if not -len(list_) <= index < len(list_):
+            raise CommandError("ERR index out of range")
+        list_[index] = value
+        return OK
+
+    def cmd_rpop(self, key):
+        list_ = self._list(key)
+        item = list_.pop() if list_ else None
+        self._drop_empty(key)
+        return item
+
+    def cmd_lpop(self, key):
+        list_ = self._list(key)
+        item = list_.pop(0) if list_ else None
+        self._drop_empty(key)
+        return item
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Replies are written one by one, don't let Nagle hold pipelined ones back
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        read, write, redis = self.rfile.readline, self.wfile.write, self.server.redis
+        while True:
+            line = read()
+            if not line:
+                return
+            if line[:1] != b'*':
+                # Inline command
+                args = line.split()
+                if not args:
+                    continue
+            else:
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int(read()[1:])
+                    args.append(self.rfile.read(length + 2)[:-2])
+            write(encode_reply(redis.execute(args)))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Threaded TCP server in front of a FakeRedis, one thread per client connection
+    Usable as a context manager, serving in a background thread:
+        with FakeRedisServer() as server:
+            db = RedisDB(*server.address)
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host: str='127.0.0.1', port: int=0):
+        """
+        :param host: str
+        :param port: int, 0 picks a free port
+        """
+        super(FakeRedisServer, self).__init__((host, port), _Handler)
+        self.redis = FakeRedis()
+        self._thread = None
+
+    @property
+    def address(self) -> tuple:
+        return self.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    with FakeRedisServer(port=6379) as server:
+        print("Fake Redis listening on {}:{}".format(*server.address))
+        server._thread.join()
+
+
+if __name__ == '__main__':
+    main()
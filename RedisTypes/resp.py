@@ -0,0 +1,55 @@
+"""
+RESP (REdis Serialization Protocol) framing helpers
+http://redis.io/topics/protocol
+"""
+
+
+def encode(value) -> bytes:
+    """
+    Encodes a command argument to bytes
+    bytes are sent as is, str as utf-8 and anything else through str()
+    :param value: object
+    :return: bytes
+    """
+    kind = type(value)
+    if kind is bytes:
+        return value
+    if kind is str:
+        return value.encode()
+    if kind is int:
+        return b'%d' % value
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    return str(value).encode()
+
+
+def _pack_into(parts: list, args):
+    parts.append(b'*%d\r\n' % len(args))
+    for arg in args:
+        arg = encode(arg)
+        parts.append(b'$%d\r\n' % len(arg))
+        parts.append(arg)
+        parts.append(b'\r\n')
+
+
+def pack_command(args) -> bytes:
+    """
+    Frames one command as a RESP multi-bulk request
+    :param args: sequence of arguments, command name first
+    :return: bytes
+    """
+    parts = []
+    _pack_into(parts, args)
+    return b''.join(parts)
+
+
+def pack_commands(commands) -> bytes:
+    """
+    Frames several commands in a single buffer, for pipelining
+    :param commands: iterable of argument sequences
+    :return: bytes
+    """
+    parts = []
+    for args in commands:
+        _pack_into(parts, args)
+    return b''.join(parts)
@@ -0,0 +1,131 @@
+"""
+Value codecs for RedisTypes
+A codec is a decoders.Decoder that can also encode values. Whatever the codec,
+ints are stored as plain ASCII digits, which skips the serializer on both ends
+and keeps them usable by HINCRBY and friends.
+"""
+import json
+import pickle
+
+from RedisTypes.decoders import Decoder
+from RedisTypes.resp import encode
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _is_int(value: bytes) -> bool:
+    return value.isdigit() or value[:1] == b'-' and value[1:].isdigit()
+
+
+class Codec(Decoder):
+    def encode(self, value) -> bytes:
+        """
+        :param value: object
+        :return: bytes
+        """
+        raise NotImplementedError
+
+
+class SerializerCodec(Codec):
+    """
+    Base for codecs delegating to a serializer through dumps/loads,
+    with the int fast path on both ends. int subclasses such as IntEnum take
+    it too, and are read back as plain int. bool goes to the serializer.
+    """
+    def dumps(self, value) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, value: bytes):
+        raise NotImplementedError
+
+    def encode(self, value) -> bytes:
+        if type(value) is int or isinstance(value, int) and not isinstance(value, bool):
+            return b'%d' % value
+        return self.dumps(value)
+
+    def decode(self, value):
+        if value is None:
+            return None
+        if _is_int(value):
+            return int(value)
+        return self.loads(value)
+
+    def decode_many(self, values) -> list:
+        loads = self.loads
+        return [None if value is None else int(value) if _is_int(value) else loads(value) for value in values]
+
+
+class BytesCodec(Codec):
+    """
+    Raw bytes, values are sent as is (str as utf-8, int as digits) and always read back as bytes
+    """
+    def encode(self, value) -> bytes:
+        return encode(value)
+
+    def decode(self, value):
+        return value
+
+    def decode_many(self, values) -> list:
+        return list(values)
+
+
+class JsonCodec(SerializerCodec):
+    """
+    Compact JSON, for nested dicts and lists of plain types
+    """
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: passed to json.dumps (e.g. default, sort_keys)
+        """
+        self._kwargs = {'separators': (',', ':')}
+        self._kwargs.update(kwargs)
+
+    def dumps(self, value) -> bytes:
+        return json.dumps(value, **self._kwargs).encode()
+
+    def loads(self, value: bytes):
+        return json.loads(value)
+
+
+class PickleCodec(SerializerCodec):
+    """
+    Any picklable object. Only use it on data written by trusted clients.
+    """
+    def __init__(self, protocol: int=pickle.HIGHEST_PROTOCOL):
+        """
+        :param protocol: int, at least 2, so that pickles can't be mistaken for digits
+        """
+        if protocol < 2:
+            raise ValueError("Pickle protocol should be at least 2.")
+        self._protocol = protocol
+
+    def dumps(self, value) -> bytes:
+        return pickle.dumps(value, self._protocol)
+
+    def loads(self, value: bytes):
+        return pickle.loads(value)
+
+
+class MsgpackCodec(SerializerCodec):
+    """
+    Compact binary msgpack, needs the msgpack package. Top level ints take the
+    digits fast path, so no payload can start with a digit or a minus sign.
+    """
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("MsgpackCodec needs the msgpack package.")
+
+    def dumps(self, value) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, value: bytes):
+        return msgpack.unpackb(value, raw=False)
+
+
+BYTES = BytesCodec()
+JSON = JsonCodec()
+PICKLE = PickleCodec()
+MSGPACK = MsgpackCodec() if msgpack is not None else None
@@ -0,0 +1,127 @@
+from bisect import bisect, insort
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5
+from typing import Iterable
+
+from RedisTypes.RedisDB import RedisDB
+from RedisTypes.resp import encode
+
+
+def _point(key: bytes) -> int:
+    return int.from_bytes(md5(key).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hashing ring, each node is placed at replicas points on the ring and
+    a key belongs to the first node point following its own hash. Adding or removing
+    a node only moves the keys of the arcs it gains or loses, about 1/N of them.
+    """
+    def __init__(self, nodes: Iterable=(), replicas: int=100):
+        """
+        :param nodes: iterable of str labels
+        :param replicas: int, points per node, more points spread keys more evenly
+        """
+        self._replicas = replicas
+        self._points = []
+        self._owners = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        for replica in range(self._replicas):
+            point = _point("{}#{}".format(node, replica).encode())
+            if point not in self._owners:
+                insort(self._points, point)
+            self._owners[point] = node
+
+    def remove(self, node: str):
+        points = [point for point, owner in self._owners.items() if owner == node]
+        for point in points:
+            del self._owners[point]
+        self._points = [point for point in self._points if point in self._owners]
+
+    def get(self, key: bytes) -> str:
+        """
+        :param key: bytes
+        :return: str, label of the owning node
+        """
+        if not self._points:
+            raise LookupError("No node in ring.")
+        index = bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+    def __len__(self) -> int:
+        return len(set(self._owners.values()))
+
+
+class ShardedRedisDB:
+    """
+    Front end spreading RedisTypes over several RedisDB nodes with consistent hashing
+    A RedisTypes.dict or list given a ShardedRedisDB lives whole on the node owning its
+    name, a RedisTypes.ShardedDict spreads its fields over every node. Fan out calls run
+    in a thread pool: use pooled nodes if several threads share the front end.
+    """
+    def __init__(self, nodes: Iterable[RedisDB], replicas: int=100, workers: int=None):
+        """
+        :param nodes: iterable of RedisDB.RedisDB
+        :param replicas: int, ring points per node
+        :param workers: int, fan out threads, defaults to the number of nodes
+        """
+        self._nodes = {}
+        self._ring = HashRing(replicas=replicas)
+        for node in nodes:
+            self.add_node(node)
+        self._executor = ThreadPoolExecutor(max_workers=workers or max(len(self._nodes), 1))
+
+    @staticmethod
+    def _label(node: RedisDB) -> str:
+        return "{}:{}".format(node._host, node._port)
+
+    @property
+    def nodes(self) -> list:
+        return list(self._nodes.values())
+
+    def add_node(self, node: RedisDB):
+        """
+        Adds a node, existing data is not moved, see ShardedDict.rebalance
+        :param node: RedisDB.RedisDB
+        """
+        if not isinstance(node, RedisDB):
+            raise TypeError("Please provide a correct RedisDB.")
+        label = self._label(node)
+        self._nodes[label] = node
+        self._ring.add(label)
+
+    def remove_node(self, node: RedisDB):
+        """
+        Removes a node, its data stays on it, see ShardedDict.rebalance
+        :param node: RedisDB.RedisDB
+        """
+        label = self._label(node)
+        self._ring.remove(label)
+        del self._nodes[label]
+
+    def node_for(self, key) -> RedisDB:
+        """
+        :param key: str or bytes
+        :return: RedisDB.RedisDB owning key
+        """
+        return self._nodes[self._ring.get(encode(key))]
+
+    def map(self, function, iterable) -> list:
+        """
+        Runs function over iterable in the fan out thread pool, results come back in order
+        :param function: callable
+        :param iterable: iterable
+        :return: list
+        """
+        return list(self._executor.map(function, iterable))
+
+    def execute_all(self, *args) -> list:
+        """
+        Runs the same command on every node in parallel
+        :param args: command name and arguments
+        :return: list of replies, in nodes order
+        """
+        return self.map(lambda node: node.execute(*args), self.nodes)
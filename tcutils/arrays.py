@@ -1,3 +1,97 @@
+import operator
+from array import array
+from bisect import bisect_left, insort
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(number):
+        return bin(number).count('1')
+
+
+def _numpy_storage(ndarray):
+    """(shape, typecode, cells) copy of a numpy array,
+    cells are an array.array of the same typecode
+    for numeric dtypes, a list of objects otherwise"""
+    if numpy is None:
+        raise ImportError("Converting from numpy needs the numpy package.")
+    ndarray = numpy.asarray(ndarray)
+    if ndarray.dtype.char == '?':
+        ndarray = ndarray.astype(numpy.uint8)
+    if ndarray.dtype.char not in _TYPECODES:
+        return ndarray.shape, None, ndarray.ravel().tolist()
+    contiguous = numpy.ascontiguousarray(ndarray, dtype=ndarray.dtype.newbyteorder('='))
+    cells = array(ndarray.dtype.char)
+    cells.frombytes(memoryview(contiguous).cast('B'))
+    return ndarray.shape, ndarray.dtype.char, cells
+
+
+# numpy dtype chars sharing their array.array typecode
+_TYPECODES = 'bBhHiIlLqQfd'
+
+
+def _bits(number):
+    """Yields the indexes of the set bits of a
+    non negative int, in ascending order"""
+    digits = format(number, 'b')[::-1]
+    index = digits.find('1')
+    while index != -1:
+        yield index
+        index = digits.find('1', index + 1)
+
+
+def _components(successors):
+    """Strongly connected components of a graph
+    given as lists of successors (iterative Tarjan),
+    in reverse topological order: sinks first"""
+    index = [None] * len(successors)
+    low = [0] * len(successors)
+    on_stack = [False] * len(successors)
+    stack = []
+    components = []
+    counter = 0
+    for root in range(len(successors)):
+        if index[root] is not None:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, iter(successors[root]))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if index[child] is None:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = True
+                    work.append((child, iter(successors[child])))
+                    break
+                elif on_stack[child]:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
 class Array(object):
     def __init__(self, default_value=None):
         self._default_value = default_value
@@ -35,20 +129,333 @@ class FixedDimArray(Array):
         return super(FixedDimArray, self).__getitem__(coords)
 
 
-class Matrix(FixedDimArray):
+class DenseArray(FixedDimArray):
+    """DenseArray is a FixedDimArray
+    of a given shape, storing every cell
+    in a flat row-major sequence: a list,
+    or an array.array of typecode for
+    numbers, e.g. 'b' takes 1 byte per cell"""
+    __slots__ = ('_shape', '_strides', '_typecode', '_cells')
+
+    def __init__(self, shape, default_value=None, typecode=None, cells=None):
+        # Cells live in _cells, Array's dict storage is not allocated
+        self._default_value = default_value
+        self._dimensions = len(shape)
+        self._shape = tuple(shape)
+        strides = []
+        stride = 1
+        for size in reversed(self._shape):
+            strides.insert(0, stride)
+            stride *= size
+        self._strides = tuple(strides)
+        self._typecode = typecode
+        if cells is None:
+            self.fill(default_value)
+        elif len(cells) != self._count():
+            raise ValueError("%s of shape %s needs %s cells" % (self.__class__.__name__, self._shape, self._count()))
+        else:
+            self._cells = cells
+
+    @property
+    def shape(self):
+        return self._shape
+
+    def __len__(self):
+        return self._count()
+
+    def fill(self, value):
+        """Sets every cell to value in a single bulk allocation"""
+        if self._typecode is None:
+            self._cells = [value] * self._count()
+        else:
+            self._cells = array(self._typecode, [value]) * self._count()
+
+    def _count(self):
+        count = 1
+        for size in self._shape:
+            count *= size
+        return count
+
+    def _offset(self, coords):
+        if not isinstance(coords, tuple):
+            raise TypeError("%s coordinates should be a tuple of int values" % self.__class__.__name__)
+        if not len(coords) == self._dimensions:
+            raise KeyError("%s coordinates should be %s items tuple" % (self.__class__.__name__, self._dimensions))
+        offset = 0
+        for coord, size, stride in zip(coords, self._shape, self._strides):
+            if not 0 <= coord < size:
+                raise IndexError("%s coordinates %s out of shape %s" % (self.__class__.__name__, coords, self._shape))
+            offset += coord * stride
+        return offset
+
+    def __setitem__(self, coords, value):
+        self._cells[self._offset(coords)] = value
+
+    def __getitem__(self, coords):
+        return self._cells[self._offset(coords)]
+
+    def _flat(self):
+        """Row-major cells"""
+        return self._cells
+
+    # Interop: the array.array storage is exposed
+    # as a buffer, numpy views it without copy
+
+    def view(self):
+        """Writable memoryview of the storage,
+        shaped like the array, typecode needed.
+        The portable way to the buffer: before
+        Python 3.12, memoryview(array) fails"""
+        if self._typecode is None:
+            raise TypeError("%s without typecode holds Python objects, it has no buffer" % self.__class__.__name__)
+        return memoryview(self._flat()).cast('B').cast(self._typecode, self._shape)
+
+    def __buffer__(self, flags):
+        """Buffer protocol, Python 3.12+ (PEP 688),
+        older versions ignore it, see view"""
+        return self.view()
+
+    def __array__(self, dtype=None, copy=None):
+        if self._typecode is not None:
+            result = numpy.asarray(self.view())
+        else:
+            result = numpy.empty(len(self), dtype=object)
+            for index, cell in enumerate(self._flat()):
+                result[index] = cell
+            result = result.reshape(self._shape)
+        if dtype is not None:
+            result = result.astype(dtype, copy=False)
+        return result.copy() if copy else result
+
+    def to_numpy(self, copy=False):
+        """numpy array viewing the storage,
+        a copy for object cells or if copy"""
+        if numpy is None:
+            raise ImportError("%s.to_numpy needs the numpy package." % self.__class__.__name__)
+        return self.__array__(copy=copy)
+
+    @classmethod
+    def from_numpy(cls, ndarray):
+        """New array holding a copy of ndarray"""
+        return cls._from_storage(*_numpy_storage(ndarray))
+
+    @classmethod
+    def _from_storage(cls, shape, typecode, cells):
+        return DenseArray(shape, 0 if typecode else None, typecode, cells)
+
+    # Elementwise arithmetic and reductions run
+    # as numpy kernels when numpy is installed
+    # and the storage is numeric, in Python else.
+    # Both give the same cells: a result keeps
+    # the typecode if it fits, float results of
+    # integer cells take 'd', and out of range
+    # integers fall back to Python object cells
+
+    def _numeric(self, other=None):
+        return numpy is not None and self._typecode is not None and (
+            not isinstance(other, DenseArray) or other._typecode is not None)
+
+    def _elementwise(self, other, operator_, ufunc_name):
+        if isinstance(other, DenseArray) and other.shape != self._shape:
+            raise ValueError("%s shapes differ: %s and %s" % (self.__class__.__name__, self._shape, other.shape))
+        if self._numeric(other):
+            ufunc = getattr(numpy, ufunc_name)
+            left, right = numpy.asarray(self), numpy.asarray(other)
+            result = ufunc(left, right)
+            if result.dtype.kind == 'f':
+                return DenseArray.from_numpy(result.astype(self._typecode if self._typecode in 'fd' else 'd'))
+            # numpy integers wrap around silently, check the range on floats,
+            # with a margin for the 64 bits ones that floats round
+            bounds = numpy.iinfo(self._typecode)
+            margin = 1 - 2.0 ** -40 if bounds.bits == 64 else 1
+            check = ufunc(left.astype(numpy.float64), right.astype(numpy.float64))
+            if not check.size or bounds.min * margin <= check.min() and check.max() <= bounds.max * margin:
+                return DenseArray.from_numpy(result.astype(self._typecode))
+        if isinstance(other, DenseArray):
+            cells = list(map(operator_, self._flat(), other._flat()))
+        else:
+            cells = [operator_(cell, other) for cell in self._flat()]
+        if self._typecode is not None:
+            try:
+                return DenseArray(self._shape, 0, self._typecode, array(self._typecode, cells))
+            except OverflowError:
+                pass
+            except TypeError:
+                # Float cells out of integer ones
+                try:
+                    return DenseArray(self._shape, 0, 'd', array('d', cells))
+                except (TypeError, OverflowError):
+                    pass
+        return DenseArray(self._shape, None, None, cells)
+
+    def __add__(self, other):
+        return self._elementwise(other, operator.add, 'add')
+
+    def __sub__(self, other):
+        return self._elementwise(other, operator.sub, 'subtract')
+
+    def __mul__(self, other):
+        return self._elementwise(other, operator.mul, 'multiply')
+
+    def __truediv__(self, other):
+        return self._elementwise(other, operator.truediv, 'true_divide')
+
+    def __floordiv__(self, other):
+        return self._elementwise(other, operator.floordiv, 'floor_divide')
+
+    def sum(self):
+        if self._numeric():
+            return numpy.asarray(self).sum().item()
+        return sum(self._flat())
+
+    def min(self):
+        if self._numeric():
+            return numpy.asarray(self).min().item()
+        return min(self._flat())
+
+    def max(self):
+        if self._numeric():
+            return numpy.asarray(self).max().item()
+        return max(self._flat())
+
+
+class SparseArray(FixedDimArray):
+    """SparseArray is a FixedDimArray
+    of a given shape only storing the cells
+    differing from the default value, writing
+    the default value removes the cell. An
+    index per axis, built on first use then kept
+    up to date by writes, lists the stored
+    cells of any row or column, see coo for
+    the compressed coordinate arrays"""
+    __slots__ = ('_shape', '_indexes')
+
+    def __init__(self, shape, default_value=None):
+        super(SparseArray, self).__init__(len(shape), default_value)
+        self._shape = tuple(shape)
+        self._indexes = [None] * len(self._shape)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def nnz(self):
+        """Number of stored, non default, cells"""
+        return len(self._inner)
+
+    def _check(self, coords):
+        if not isinstance(coords, tuple):
+            raise TypeError("%s coordinates should be a tuple of int values" % self.__class__.__name__)
+        if not len(coords) == self._dimensions:
+            raise KeyError("%s coordinates should be %s items tuple" % (self.__class__.__name__, self._dimensions))
+        for coord, size in zip(coords, self._shape):
+            if not 0 <= coord < size:
+                raise IndexError("%s coordinates %s out of shape %s" % (self.__class__.__name__, coords, self._shape))
+
+    def _invalidate(self):
+        self._indexes = [None] * len(self._shape)
+
+    def _indexed(self, coords):
+        # A new stored cell joins the built indexes, in row-major order
+        for axis, index in enumerate(self._indexes):
+            if index is not None:
+                insort(index.setdefault(coords[axis], []), coords)
+
+    def _unindexed(self, coords):
+        for axis, index in enumerate(self._indexes):
+            if index is not None:
+                cells = index[coords[axis]]
+                del cells[bisect_left(cells, coords)]
+                if not cells:
+                    del index[coords[axis]]
+
+    def __setitem__(self, coords, value):
+        self._check(coords)
+        if value is self._default_value or value == self._default_value:
+            if self._inner.pop(coords, self) is not self:
+                self._unindexed(coords)
+        else:
+            if coords not in self._inner:
+                self._indexed(coords)
+            self._inner[coords] = value
+
+    def __getitem__(self, coords):
+        self._check(coords)
+        return self._inner.get(coords, self._default_value)
+
+    def __delitem__(self, coords):
+        self[coords] = self._default_value
+
+    def clear(self):
+        self._inner.clear()
+        self._invalidate()
+
+    def _index(self, axis):
+        """{coord on axis: row-major sorted coords of the stored cells}"""
+        index = self._indexes[axis]
+        if index is None:
+            index = {}
+            for coords in sorted(self._inner):
+                index.setdefault(coords[axis], []).append(coords)
+            self._indexes[axis] = index
+        return index
+
+    def along(self, axis, coord):
+        """Yields the (coords, value) stored cells
+        whose coordinate on axis is coord"""
+        inner = self._inner
+        for coords in self._index(axis).get(coord, ()):
+            yield coords, inner[coords]
+
+    def row(self, index):
+        """(column, value) stored cells of a 2 dimensions row"""
+        return [(coords[1], value) for coords, value in self.along(0, index)]
+
+    def column(self, index):
+        """(row, value) stored cells of a 2 dimensions column"""
+        return [(coords[0], value) for coords, value in self.along(1, index)]
+
+    def counts(self, axis):
+        """{coord on axis: number of stored cells}"""
+        return {coord: len(cells) for coord, cells in self._index(axis).items()}
+
+    def items(self):
+        """Row-major sorted (coords, value) stored cells"""
+        inner = self._inner
+        return [(coords, inner[coords]) for coords in sorted(inner)]
+
+    def coo(self):
+        """Coordinate format: one array of coords per
+        axis and the list of values, row-major sorted"""
+        items = self.items()
+        axes = tuple(array('q', [coords[axis] for coords, _ in items]) for axis in range(self._dimensions))
+        return axes, [value for _, value in items]
+
+    def to_dense(self, typecode=None):
+        dense = DenseArray(self._shape, self._default_value, typecode)
+        for coords, value in self._inner.items():
+            dense[coords] = value
+        return dense
+
+
+class Matrix(DenseArray):
     """Matrix is a symmetrical, fixed
     size 2 dimensions Array with all
     items initialized"""
-    def __init__(self, size, initial_value):
-        super(Matrix, self).__init__(2)
+    def __init__(self, size, initial_value, typecode=None, cells=None):
         self._size = size
         self._initial_value = initial_value
-        self._initialize_board(initial_value)
+        super(Matrix, self).__init__((size, size), initial_value, typecode, cells)
 
     def _initialize_board(self, value):
-        for y in range(self._size):
-            for x in range(self._size):
-                self[x, y] = value
+        self.fill(value)
+
+    @classmethod
+    def _from_storage(cls, shape, typecode, cells):
+        if len(shape) != 2 or shape[0] != shape[1]:
+            raise ValueError("%s needs a square 2 dimensions array, not %s" % (cls.__name__, shape))
+        return cls(shape[0], 0 if typecode else None, typecode, cells)
 
     def __repr__(self):
         ret = "\n"
@@ -67,14 +474,169 @@ class Matrix(FixedDimArray):
 class MathMatrix(Matrix):
     """MathMatrix is a Matrix with
     default value set to 0 and only
-    accepting 0 or 1 as set value"""
+    accepting 0 or 1 as set value.
+    Cells are bit-packed, row x is an
+    int whose bit y is self[x, y], so
+    boolean operations work a row at
+    a time, e.g. as an adjacency matrix
+    where self[x, y] is an edge x -> y"""
     def __init__(self, size):
-        super(MathMatrix, self).__init__(size, 0)
+        super(MathMatrix, self).__init__(size, 0, 'B')
+
+    def fill(self, value):
+        if value not in (0, 1):
+            raise ValueError("%s item value should be either 0 or 1" % self.__class__.__name__)
+        self._rows = [(1 << self._size) - 1 if value else 0] * self._size
+
+    @classmethod
+    def _from_rows(cls, rows):
+        matrix = cls.__new__(cls)
+        MathMatrix.__init__(matrix, len(rows))
+        matrix._rows = rows
+        return matrix
+
+    def _flat(self):
+        # Unpacked copy, one byte per cell
+        to_bytes = bytes.maketrans(b'01', b'\x00\x01')
+        cells = bytearray()
+        for row in self._rows:
+            cells += format(row, '0%db' % self._size)[::-1].encode().translate(to_bytes)
+        return array('B', bytes(cells))
+
+    # The bits are packed in Python ints, buffers
+    # only expose an unpacked copy of them
+
+    def view(self):
+        """Read-only memoryview of an unpacked
+        copy of the cells, one byte per cell"""
+        return memoryview(self._flat()).cast('B', self._shape).toreadonly()
+
+    def __buffer__(self, flags):
+        """Read-only buffer, Python 3.12+, see view"""
+        return self.view()
+
+    def to_numpy(self, copy=True):
+        """New numpy array of the cells,
+        always a copy, see view"""
+        return super(MathMatrix, self).to_numpy(copy=True)
+
+    @classmethod
+    def from_numpy(cls, ndarray):
+        """New MathMatrix, set where ndarray is non zero"""
+        if numpy is None:
+            raise ImportError("Converting from numpy needs the numpy package.")
+        ndarray = numpy.asarray(ndarray)
+        if ndarray.ndim != 2 or ndarray.shape[0] != ndarray.shape[1]:
+            raise ValueError("%s needs a square 2 dimensions array, not %s" % (cls.__name__, ndarray.shape))
+        packed = numpy.packbits(ndarray != 0, axis=1, bitorder='little')
+        return cls._from_rows([int.from_bytes(row.tobytes(), 'little') for row in packed])
 
     def __setitem__(self, coords, value):
         if value not in (0, 1):
             raise ValueError("%s item value should be either 0 or 1" % self.__class__.__name__)
-        super(MathMatrix, self).__setitem__(coords, value)
+        self._offset(coords)
+        x, y = coords
+        if value:
+            self._rows[x] |= 1 << y
+        else:
+            self._rows[x] &= ~(1 << y)
+
+    def __getitem__(self, coords):
+        self._offset(coords)
+        x, y = coords
+        return self._rows[x] >> y & 1
+
+    def row(self, x):
+        """Indexes y of the set cells of row x"""
+        return list(_bits(self._rows[x]))
+
+    def _check_size(self, other):
+        if not isinstance(other, MathMatrix):
+            return NotImplemented
+        if other._size != self._size:
+            raise ValueError("%s sizes differ: %s and %s" % (self.__class__.__name__, self._size, other._size))
+
+    def __and__(self, other):
+        if self._check_size(other) is NotImplemented:
+            return NotImplemented
+        return self._from_rows([mine & theirs for mine, theirs in zip(self._rows, other._rows)])
+
+    def __or__(self, other):
+        if self._check_size(other) is NotImplemented:
+            return NotImplemented
+        return self._from_rows([mine | theirs for mine, theirs in zip(self._rows, other._rows)])
+
+    def __xor__(self, other):
+        if self._check_size(other) is NotImplemented:
+            return NotImplemented
+        return self._from_rows([mine ^ theirs for mine, theirs in zip(self._rows, other._rows)])
+
+    def __invert__(self):
+        mask = (1 << self._size) - 1
+        return self._from_rows([row ^ mask for row in self._rows])
+
+    def popcount(self):
+        """Number of cells set to 1"""
+        return sum(map(_popcount, self._rows))
+
+    def transpose(self):
+        columns = [[] for _ in range(self._size)]
+        for x, row in enumerate(self._rows):
+            for y in _bits(row):
+                columns[y].append(x)
+        rows = []
+        for xs in columns:
+            if len(xs) < 64:
+                rows.append(sum(1 << x for x in xs))
+                continue
+            # Dense column, parsed from a binary string, highest bit first
+            digits = bytearray(b'0') * self._size
+            for x in xs:
+                digits[self._size - 1 - x] = ord('1')
+            rows.append(int(digits, 2))
+        return self._from_rows(rows)
+
+    def __matmul__(self, other):
+        """Boolean product: (self @ other)[x, y] is
+        1 if self[x, k] and other[k, y] for some k"""
+        if self._check_size(other) is NotImplemented:
+            return NotImplemented
+        rows = []
+        for row in self._rows:
+            product = 0
+            for k in _bits(row):
+                product |= other._rows[k]
+            rows.append(product)
+        return self._from_rows(rows)
+
+    def transitive_closure(self):
+        """Reachability: result[x, y] is 1 if there
+        is a path of one or more edges from x to y.
+        Rows are ORed over the strongly connected
+        components, from the sinks up"""
+        successors = [list(_bits(row)) for row in self._rows]
+        components = _components(successors)
+        component_of = [0] * self._size
+        for component, members in enumerate(components):
+            for member in members:
+                component_of[member] = component
+        reach = [0] * len(components)
+        for component, members in enumerate(components):
+            direct = 0
+            for member in members:
+                direct |= self._rows[member]
+            closure = direct
+            if len(members) > 1:
+                for member in members:
+                    closure |= 1 << member
+            seen = {component}
+            for node in _bits(direct):
+                target = component_of[node]
+                if target not in seen:
+                    seen.add(target)
+                    closure |= reach[target]
+            reach[component] = closure
+        return self._from_rows([reach[component_of[x]] for x in range(self._size)])
 
 
 class TicTacToeBoard(Matrix):
@@ -87,6 +649,16 @@ class TicTacToeBoard(Matrix):
         super(TicTacToeBoard, self).__init__(3, " ")
         self._initializing = False
 
+    @classmethod
+    def _from_storage(cls, shape, typecode, cells):
+        if tuple(shape) != (3, 3):
+            raise ValueError("%s needs a 3x3 array, not %s" % (cls.__name__, shape))
+        board = cls()
+        for offset, cell in enumerate(cells):
+            if cell != board._initial_value:
+                board[offset // 3, offset % 3] = cell
+        return board
+
     def __setitem__(self, coords, value):
         if value not in ('X', 'O') and not (self._initializing and value == self._initial_value):
             raise ValueError("%s item value should be either 'X' or 'O'" % self.__class__.__name__)